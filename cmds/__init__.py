@@ -0,0 +1,17 @@
+"""Command modules that MyCMD imports lazily, the first time one of their commands runs.
+
+A command is a function ``command(shell, args)`` and is declared in data.json's
+"modules" section as ``"name": "package.module:function"``, or by another package
+through the ``mycmd.commands`` entry point group. Usage hints, descriptions and
+completers for these commands come from data.json's "usages", "commands" and
+"completers" sections.
+
+Plugins that need more than that (their own completers, several commands) expose
+a ``register(registry)`` function and are listed in data.json's "plugins" section
+or the ``mycmd.plugins`` entry point group::
+
+    def register(registry):
+        registry.add_completer("hosts", lambda shell, fragment: ...)
+        registry.register("ping", "myplugin.net:ping", usage="ping <host>",
+                          description="Ping a host.", completer="hosts")
+"""
@@ -0,0 +1,336 @@
+"""zip, unzip, tar and untar builtins that stream entries instead of loading whole files."""
+
+import os
+import io
+import zlib
+import struct
+import fnmatch
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CHUNK_SIZE = 1 << 20
+# last 32 KiB of the previous block primes each block's compressor, as pigz does
+WINDOW = 32 * 1024
+
+
+def _walk(paths, skip):
+    """Yield (path, arcname, is_dir) for every path, recursing with scandir. skip is a realpath to leave out."""
+    for top in paths:
+        top = top.rstrip(os.sep) or os.sep
+        arc_root = os.path.basename(os.path.abspath(top))
+        if os.path.isdir(top):
+            stack = [(top, arc_root)]
+            while stack:
+                path, arcname = stack.pop()
+                yield path, arcname, True
+                try:
+                    with os.scandir(path) as it:
+                        entries = sorted(it, key=lambda e: e.name)
+                except OSError as e:
+                    print(f"{path}: {e}")
+                    continue
+                # reversed so the stack pops entries in name order
+                for entry in reversed(entries):
+                    child = (entry.path, f"{arcname}/{entry.name}")
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(child)
+                    elif os.path.realpath(entry.path) != skip:
+                        yield child[0], child[1], False
+        elif os.path.exists(top):
+            yield top, arc_root, False
+        else:
+            print(f"{top}: No such file or directory")
+
+
+def _matches(name, patterns):
+    """True if no patterns were given, or name equals/lives under/globs one of them."""
+    if not patterns:
+        return True
+    name = name.rstrip("/")
+    return any(name == p.rstrip("/") or name.startswith(p.rstrip("/") + "/") or fnmatch.fnmatch(name, p)
+               for p in patterns)
+
+
+def _split_opts(args, with_value):
+    """Separate '-x value' options (those in with_value) and flags from positional arguments."""
+    opts = {}
+    rest = []
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a in with_value:
+            if i + 1 >= len(args):
+                raise ValueError(f"option {a} needs a value")
+            opts[a] = args[i + 1]
+            i += 2
+            continue
+        if a.startswith("-") and len(a) > 1:
+            opts[a] = True
+        else:
+            rest.append(a)
+        i += 1
+    return opts, rest
+
+
+def _threads(shell, opts):
+    value = opts.get("-j") or shell.config.get("settings", {}).get("archive_threads") or os.cpu_count() or 1
+    return max(1, int(value))
+
+
+class ParallelGzipWriter(io.RawIOBase):
+    """Write-only file object producing one gzip member, compressed in parallel blocks.
+
+    Like pigz, the input is cut into blocks that are deflated on a thread pool
+    (zlib releases the GIL), each primed with the tail of the previous block and
+    ended with a sync flush so the pieces concatenate into a single deflate stream.
+    """
+
+    def __init__(self, fileobj, level=6, threads=None, block_size=CHUNK_SIZE):
+        super().__init__()
+        self.fileobj = fileobj
+        self.level = level
+        self.block_size = block_size
+        self.threads = threads or os.cpu_count() or 1
+        self._pool = ThreadPoolExecutor(max_workers=self.threads)
+        self._pending = []
+        self._buf = bytearray()
+        self._prev_tail = b""
+        self._crc = 0
+        self._size = 0
+        # gzip header: magic, deflate, no flags, no mtime, unknown OS
+        fileobj.write(b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff")
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        self._buf += data
+        while len(self._buf) >= self.block_size:
+            self._submit(bytes(self._buf[:self.block_size]), last=False)
+            del self._buf[:self.block_size]
+        return len(data)
+
+    def _submit(self, block, last):
+        self._pending.append(self._pool.submit(self._deflate, block, self._prev_tail, last))
+        self._prev_tail = block[-WINDOW:]
+        # keep a bounded number of blocks in flight so memory stays flat
+        while len(self._pending) > self.threads * 2:
+            self.fileobj.write(self._pending.pop(0).result())
+
+    def _deflate(self, block, zdict, last):
+        if zdict:
+            comp = zlib.compressobj(self.level, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, zdict)
+        else:
+            comp = zlib.compressobj(self.level, zlib.DEFLATED, -15, 9)
+        return comp.compress(block) + comp.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self._submit(bytes(self._buf), last=True)
+            for future in self._pending:
+                self.fileobj.write(future.result())
+            self._pending = []
+            self.fileobj.write(struct.pack("<II", self._crc & 0xFFFFFFFF, self._size & 0xFFFFFFFF))
+        finally:
+            self._pool.shutdown()
+            super().close()
+
+
+def _compression(name, opts):
+    if opts.get("--zstd") or name.endswith((".zst", ".tzst")):
+        return "zst"
+    if opts.get("-z") or opts.get("--gzip") or name.endswith((".gz", ".tgz")):
+        return "gz"
+    return ""
+
+
+def zip(shell, args):
+    """Create a zip archive. Usage: zip [-0..-9] <archive.zip> <path ...>"""
+    try:
+        opts, rest = _split_opts(args, ())
+    except ValueError as e:
+        print(f"zip: {e}")
+        return 2
+    if len(rest) < 2:
+        print("Usage: zip [-0..-9] <archive.zip> <path ...>")
+        return 2
+    archive, paths = rest[0], rest[1:]
+    level = next((int(o[1:]) for o in opts if o[1:].isdigit()), 6)
+    method = zipfile.ZIP_STORED if level == 0 else zipfile.ZIP_DEFLATED
+    count = 0
+    try:
+        with zipfile.ZipFile(archive, "w", compression=method, compresslevel=level or None) as zf:
+            for path, arcname, is_dir in _walk(paths, os.path.realpath(archive)):
+                if shell.cancel_event.is_set():
+                    print("zip: cancelled")
+                    return 130
+                # ZipFile.write streams the file in chunks and, unlike open(ZipInfo), honours compresslevel
+                zf.write(path, arcname)
+                if not is_dir:
+                    count += 1
+    except OSError as e:
+        print(f"zip: {e}")
+        return 1
+    print(f"Added {count} files to {archive}.")
+
+
+def unzip(shell, args):
+    """List or extract a zip archive. Usage: unzip [-l] [-d dir] <archive.zip> [member ...]"""
+    try:
+        opts, rest = _split_opts(args, ("-d",))
+    except ValueError as e:
+        print(f"unzip: {e}")
+        return 2
+    if not rest:
+        print("Usage: unzip [-l] [-d dir] <archive.zip> [member ...]")
+        return 2
+    archive, patterns = rest[0], rest[1:]
+    try:
+        # ZipFile only reads the central directory; members are streamed on demand
+        with zipfile.ZipFile(archive) as zf:
+            members = [m for m in zf.infolist() if _matches(m.filename, patterns)]
+            if opts.get("-l"):
+                lines = [f"{m.file_size:>12}  {'%04d-%02d-%02d %02d:%02d' % m.date_time[:5]}  {m.filename}" for m in members]
+                files = sum(1 for m in members if not m.is_dir())
+                lines.append(f"{sum(m.file_size for m in members):>12}  {files} files")
+                shell.out.lines(lines)
+                return
+            dest = opts.get("-d", ".")
+            for member in members:
+                if shell.cancel_event.is_set():
+                    print("unzip: cancelled")
+                    return 130
+                zf.extract(member, dest)
+    except (OSError, zipfile.BadZipFile) as e:
+        print(f"unzip: {archive}: {e}")
+        return 1
+    print(f"Extracted {len(members)} entries to {opts.get('-d', '.')}.")
+
+
+def tar(shell, args):
+    """Create a tar archive, optionally gzip (parallel) or zstd compressed.
+
+    Usage: tar [-z|--gzip|--zstd] [-0..-9] [-j threads] <archive> <path ...>
+    """
+    try:
+        opts, rest = _split_opts(args, ("-j",))
+    except ValueError as e:
+        print(f"tar: {e}")
+        return 2
+    if len(rest) < 2:
+        print("Usage: tar [-z|--gzip|--zstd] [-0..-9] [-j threads] <archive> <path ...>")
+        return 2
+    archive, paths = rest[0], rest[1:]
+    kind = _compression(archive, opts)
+    level = next((int(o[1:]) for o in opts if o[1:].isdigit()), 6 if kind == "gz" else 3)
+    if kind == "zst" and zstandard is None:
+        print("tar: zstandard module not installed. Install it via 'pip install zstandard'.")
+        return 1
+    count = 0
+    try:
+        threads = _threads(shell, opts)
+        with open(archive, "wb") as raw:
+            if kind == "gz":
+                stream = ParallelGzipWriter(raw, level=level, threads=threads)
+            elif kind == "zst":
+                stream = zstandard.ZstdCompressor(level=level, threads=threads).stream_writer(raw, closefd=False)
+            else:
+                stream = raw
+            try:
+                # "w|" streams headers and data straight through without seeking
+                with tarfile.open(fileobj=stream, mode="w|", bufsize=CHUNK_SIZE) as tf:
+                    for path, arcname, is_dir in _walk(paths, os.path.realpath(archive)):
+                        if shell.cancel_event.is_set():
+                            print("tar: cancelled")
+                            return 130
+                        info = tf.gettarinfo(path, arcname)
+                        if info is None:
+                            continue
+                        if info.isreg():
+                            with open(path, "rb") as src:
+                                tf.addfile(info, src)
+                            count += 1
+                        else:
+                            tf.addfile(info)
+            finally:
+                if stream is not raw:
+                    stream.close()
+    except (OSError, ValueError) as e:
+        print(f"tar: {e}")
+        return 1
+    print(f"Added {count} files to {archive}.")
+
+
+def _open_tar(archive, kind):
+    """Open for reading: seekable for plain tars (listing skips file data), streamed otherwise."""
+    if kind == "zst":
+        if zstandard is None:
+            raise OSError("zstandard module not installed. Install it via 'pip install zstandard'.")
+        raw = open(archive, "rb")
+        return tarfile.open(fileobj=zstandard.ZstdDecompressor().stream_reader(raw), mode="r|"), raw
+    if kind == "gz":
+        # multi-threaded writers may produce several members; gzip reads them all
+        return tarfile.open(archive, mode="r|gz", bufsize=CHUNK_SIZE), None
+    return tarfile.open(archive, mode="r:"), None
+
+
+def untar(shell, args):
+    """List or extract a tar archive. Usage: untar [-l] [-C dir] [-z|--zstd] <archive> [member ...]"""
+    try:
+        opts, rest = _split_opts(args, ("-C",))
+    except ValueError as e:
+        print(f"untar: {e}")
+        return 2
+    if not rest:
+        print("Usage: untar [-l] [-C dir] [-z|--zstd] <archive> [member ...]")
+        return 2
+    archive, patterns = rest[0], rest[1:]
+    dest = opts.get("-C", ".")
+    listing = []
+    count = 0
+    raw = None
+    try:
+        tf, raw = _open_tar(archive, _compression(archive, opts))
+        with tf:
+            for member in tf:
+                if shell.cancel_event.is_set():
+                    print("untar: cancelled")
+                    return 130
+                if not _matches(member.name, patterns):
+                    continue
+                if opts.get("-l"):
+                    listing.append(f"{member.size:>12}  {member.name}")
+                    continue
+                if hasattr(tarfile, "data_filter"):
+                    try:
+                        tf.extract(member, dest, filter="data")
+                    except tarfile.FilterError as e:
+                        print(f"untar: skipping unsafe path '{member.name}': {e}")
+                        continue
+                else:
+                    if member.name.startswith("/") or ".." in member.name.split("/"):
+                        print(f"untar: skipping unsafe path '{member.name}'")
+                        continue
+                    tf.extract(member, dest)
+                count += 1
+    except (OSError, tarfile.TarError) as e:
+        print(f"untar: {archive}: {e}")
+        return 1
+    finally:
+        if raw is not None:
+            raw.close()
+    if opts.get("-l"):
+        shell.out.lines(listing)
+    else:
+        print(f"Extracted {count} entries to {dest}.")
@@ -0,0 +1,190 @@
+"""Frecency-ranked directory index behind cd and the z command, plus the pushd/popd stack."""
+
+import os
+import time
+
+# a visit loses half its weight after a week
+HALF_LIFE = 7 * 24 * 3600
+
+
+class DirIndex:
+    """Visit ranks per directory, decayed exponentially with age.
+
+    The store is a text file of "path|rank|timestamp" lines (the format z uses).
+    It is only read on the first lookup or save; visits recorded before that are
+    kept in memory and merged in, so cd never waits on the disk.
+    """
+
+    def __init__(self, path, max_entries=1000, half_life=HALF_LIFE):
+        self.path = path
+        self.max_entries = max_entries
+        self.half_life = half_life
+        self._entries = None  # path -> [rank, last visit]
+        self._pending = []
+        self._ranked = None
+        self._dirty = False
+
+    def _load(self):
+        if self._entries is not None:
+            return self._entries
+        entries = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        path, rank, ts = line.rstrip("\n").rsplit("|", 2)
+                        entries[path] = [float(rank), float(ts)]
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            pass
+        self._entries = entries
+        for path, now in self._pending:
+            self._bump(path, now)
+        self._pending = []
+        return entries
+
+    def _decayed(self, rank, ts, now):
+        return rank * 0.5 ** ((now - ts) / self.half_life)
+
+    def record(self, path, now=None):
+        """Count a visit to path."""
+        now = now or time.time()
+        self._dirty = True
+        self._ranked = None
+        if self._entries is None:
+            self._pending.append((path, now))
+        else:
+            self._bump(path, now)
+
+    def _bump(self, path, now):
+        entry = self._entries.get(path)
+        rank = self._decayed(entry[0], entry[1], now) + 1 if entry else 1.0
+        self._entries[path] = [rank, now]
+        if len(self._entries) > self.max_entries:
+            self._age(now)
+
+    def _age(self, now):
+        """Drop the lowest-scoring tenth of the index once it outgrows max_entries."""
+        entries = self._entries
+        worst = sorted(entries, key=lambda p: self._decayed(*entries[p], now))
+        for path in worst[:max(1, len(worst) // 10)]:
+            del entries[path]
+
+    def remove(self, path):
+        if self._load().pop(path, None) is not None:
+            self._dirty = True
+            self._ranked = None
+
+    def score(self, path, now=None):
+        entry = self._load().get(path)
+        return self._decayed(entry[0], entry[1], now or time.time()) if entry else 0.0
+
+    def ranked(self):
+        """Paths ordered by frecency, best first (cached until the next visit)."""
+        if self._ranked is None:
+            entries = self._load()
+            now = time.time()
+            self._ranked = sorted(entries, key=lambda p: self._decayed(*entries[p], now), reverse=True)
+        return self._ranked
+
+    def match(self, fragments):
+        """Yield ranked paths containing every fragment in order, the last one within the final component.
+
+        Matching is case-insensitive unless a fragment contains an uppercase letter.
+        """
+        fold = not any(c.isupper() for frag in fragments for c in frag)
+        if fold:
+            fragments = [frag.lower() for frag in fragments]
+        for path in self.ranked():
+            hay = path.lower() if fold else path
+            pos = 0
+            for frag in fragments:
+                pos = hay.find(frag, pos)
+                if pos < 0:
+                    break
+                pos += len(frag)
+            else:
+                if not fragments or fragments[-1] in os.path.basename(hay.rstrip(os.path.sep)):
+                    yield path
+
+    def save(self):
+        """Write the index back atomically if anything changed."""
+        if not self._dirty:
+            return
+        entries = self._load()
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.writelines(f"{path}|{rank:.4f}|{int(ts)}\n" for path, (rank, ts) in entries.items())
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except OSError:
+            pass
+
+
+def z(shell, args):
+    """Jump to the best-ranked directory matching all fragments. Usage: z [-l] [-x] [fragment ...]"""
+    index = shell.dir_index
+    if "-x" in args:
+        index.remove(os.getcwd())
+        print(f"z: removed {os.getcwd()}")
+        return
+    fragments = [a for a in args if a != "-l"]
+    if "-l" in args or not fragments:
+        matches = list(index.match(fragments))[:20]
+        now = time.time()
+        shell.out.lines(f"{index.score(path, now):>10.2f}  {path}" for path in reversed(matches))
+        return
+    for path in index.match(fragments):
+        if shell.change_dir(path, quiet=True):
+            return
+        # the directory is gone: forget it and try the next candidate
+        index.remove(path)
+    print(f"z: no match for '{' '.join(fragments)}'")
+
+
+def pushd(shell, args):
+    """Push the current directory and cd to dir; without a dir, swap with the top of the stack."""
+    cwd = os.getcwd()
+    if args:
+        target = args[0]
+    elif shell.dir_stack:
+        target = shell.dir_stack.pop()
+    else:
+        print("pushd: no other directory")
+        return 1
+    if shell.change_dir(target, "pushd"):
+        shell.dir_stack.append(cwd)
+        dirs(shell, [])
+        return 0
+    if not args:
+        shell.dir_stack.append(target)
+    return 1
+
+
+def popd(shell, args):
+    """Pop the top of the directory stack and cd to it."""
+    if not shell.dir_stack:
+        print("popd: directory stack empty")
+        return 1
+    if not shell.change_dir(shell.dir_stack.pop(), "popd"):
+        return 1
+    dirs(shell, [])
+
+
+def dirs(shell, args):
+    """Show the directory stack, current directory first."""
+    print(" ".join([os.getcwd()] + shell.dir_stack[::-1]))
+
+
+def complete_z(shell, fragment):
+    return list(shell.dir_index.match([fragment]))
+
+
+def complete_cd(shell, fragment):
+    """Local directories first, then ranked ones from the index for bare fragments."""
+    local = list(shell.commands.completer("dirs")(shell, fragment))
+    if os.path.sep in fragment or not fragment:
+        return local
+    return local + list(shell.dir_index.match([fragment]))[:20]
@@ -0,0 +1,354 @@
+"""ps and top builtins that read /proc directly instead of spawning ps/top."""
+
+import os
+import json
+import time
+import shutil
+
+try:
+    import resource
+except ImportError:  # Windows: there is no /proc either, see _check_proc
+    resource = None
+
+PROC = "/proc"
+COLUMNS = ("PID", "USER", "S", "%CPU", "%MEM", "RSS", "THR", "TIME", "COMMAND")
+SORT_KEYS = {
+    "pid": lambda r: r["pid"],
+    "cpu": lambda r: r["cpu"],
+    "mem": lambda r: r["rss"],
+    "rss": lambda r: r["rss"],
+    "time": lambda r: r["time"],
+    "name": lambda r: r["name"].lower(),
+}
+
+
+class ProcReader:
+    """Samples /proc/<pid>/stat for every process.
+
+    The stat files stay open between samples (up to a budget well below the fd
+    limit) and are re-read with pread into one reusable buffer, so a refresh is
+    a scandir plus one syscall per process. CPU usage is the tick delta since
+    the previous sample; on the first sample it is the lifetime average, as ps
+    reports it.
+    """
+
+    def __init__(self, with_cmdline=False):
+        self.with_cmdline = with_cmdline
+        self.clk = os.sysconf("SC_CLK_TCK")
+        self.page = os.sysconf("SC_PAGE_SIZE")
+        self.mem_total = _meminfo().get("MemTotal", 0)
+        soft = resource.getrlimit(resource.RLIMIT_NOFILE)[0] if resource else 0
+        self.max_fds = max(0, min(1024, soft // 2))
+        self._fds = {}  # pid -> (fd, uid)
+        self._ticks = {}  # pid -> utime + stime at the previous sample
+        self._last = None
+        self._users = {}
+        self._buf = bytearray(4096)
+
+    def close(self):
+        for fd, _ in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+
+    def _user(self, uid):
+        name = self._users.get(uid)
+        if name is None:
+            try:
+                import pwd
+                name = pwd.getpwuid(uid).pw_name
+            except (ImportError, KeyError):
+                name = str(uid)
+            self._users[uid] = name
+        return name
+
+    def _read_stat(self, pid):
+        """Return (raw stat bytes, uid), or None if the process is gone."""
+        cached = self._fds.get(pid)
+        try:
+            if cached is None:
+                fd = os.open(f"{PROC}/{pid}/stat", os.O_RDONLY)
+                uid = os.fstat(fd).st_uid
+                if len(self._fds) < self.max_fds:
+                    self._fds[pid] = (fd, uid)
+                    cached = (fd, uid)
+                else:
+                    try:
+                        n = os.preadv(fd, [self._buf], 0)
+                    finally:
+                        os.close(fd)
+                    return bytes(self._buf[:n]), uid
+            fd, uid = cached
+            n = os.preadv(fd, [self._buf], 0)
+            return bytes(self._buf[:n]), uid
+        except OSError:
+            self._drop(pid)
+            return None
+
+    def _drop(self, pid):
+        cached = self._fds.pop(pid, None)
+        if cached:
+            os.close(cached[0])
+        self._ticks.pop(pid, None)
+
+    def sample(self):
+        now = time.monotonic()
+        uptime = _uptime()
+        elapsed = now - self._last if self._last else None
+        with os.scandir(PROC) as it:
+            pids = [int(entry.name) for entry in it if entry.name.isdigit()]
+        for pid in set(self._fds).difference(pids):
+            self._drop(pid)
+        rows = []
+        for pid in pids:
+            raw = self._read_stat(pid)
+            if raw is None:
+                continue
+            data, uid = raw
+            # comm may itself contain spaces and parentheses
+            lp, rp = data.find(b"("), data.rfind(b")")
+            fields = data[rp + 2:].split()
+            try:
+                ticks = int(fields[11]) + int(fields[12])
+                threads = int(fields[17])
+                start = int(fields[19]) / self.clk
+                rss = int(fields[21]) * self.page
+            except (IndexError, ValueError):
+                continue
+            prev = self._ticks.get(pid)
+            if elapsed and prev is not None:
+                cpu = (ticks - prev) / self.clk / elapsed * 100
+            else:
+                lifetime = uptime - start
+                cpu = ticks / self.clk / lifetime * 100 if lifetime > 0 else 0.0
+            self._ticks[pid] = ticks
+            name = data[lp + 1:rp].decode("utf-8", errors="replace")
+            if self.with_cmdline:
+                name = _cmdline(pid) or f"[{name}]"
+            rows.append({
+                "pid": pid,
+                "ppid": int(fields[1]),
+                "user": self._user(uid),
+                "state": fields[0].decode(),
+                "cpu": round(cpu, 1),
+                "mem": round(rss * 100 / (self.mem_total * 1024), 1) if self.mem_total else 0.0,
+                "rss": rss,
+                "threads": threads,
+                "time": ticks / self.clk,
+                "name": name,
+            })
+        self._last = now
+        return rows
+
+
+def _meminfo():
+    info = {}
+    try:
+        with open(f"{PROC}/meminfo", "rb") as f:
+            for line in f:
+                key, _, rest = line.partition(b":")
+                info[key.decode()] = int(rest.split()[0])
+    except (OSError, ValueError, IndexError):
+        pass
+    return info
+
+
+def _uptime():
+    with open(f"{PROC}/uptime", "rb") as f:
+        return float(f.read().split()[0])
+
+
+def _cmdline(pid):
+    try:
+        with open(f"{PROC}/{pid}/cmdline", "rb") as f:
+            return f.read().replace(b"\0", b" ").strip().decode("utf-8", errors="replace")
+    except OSError:
+        return ""
+
+
+def _parse_args(name, args, default_sort):
+    opts = {"sort": default_sort, "reverse": None, "user": None, "pids": None, "match": None,
+            "json": False, "full": False, "delay": 2.0, "iterations": 0, "limit": 0}
+    i = 0
+    while i < len(args):
+        a = args[i]
+        value = args[i + 1] if i + 1 < len(args) else None
+        if a in ("-u", "--user", "-p", "--pid", "--name", "--sort", "-d", "--delay", "-n", "--limit") and value is None:
+            raise ValueError(f"option {a} needs a value")
+        if a in ("-u", "--user"):
+            opts["user"] = value
+        elif a in ("-p", "--pid"):
+            opts["pids"] = {int(p) for p in value.split(",")}
+        elif a == "--name":
+            opts["match"] = value.lower()
+        elif a == "--sort":
+            opts["reverse"] = not value.startswith("+") if value[:1] in ("+", "-") else None
+            opts["sort"] = value.lstrip("+-")
+            if opts["sort"] not in SORT_KEYS:
+                raise ValueError(f"unknown sort key '{opts['sort']}' (use {', '.join(SORT_KEYS)})")
+        elif a in ("-d", "--delay"):
+            opts["delay"] = float(value)
+        elif a == "-n":
+            opts["iterations"] = int(value)
+        elif a == "--limit":
+            opts["limit"] = int(value)
+        elif a == "--json":
+            opts["json"] = True
+            i += 1
+            continue
+        elif a in ("-f", "--full"):
+            opts["full"] = True
+            i += 1
+            continue
+        else:
+            raise ValueError(f"unknown option '{a}'")
+        i += 2
+    if opts["reverse"] is None:
+        opts["reverse"] = opts["sort"] not in ("pid", "name")
+    return opts
+
+
+def _select(rows, opts):
+    if opts["user"]:
+        rows = [r for r in rows if r["user"] == opts["user"]]
+    if opts["pids"]:
+        rows = [r for r in rows if r["pid"] in opts["pids"]]
+    if opts["match"]:
+        rows = [r for r in rows if opts["match"] in r["name"].lower()]
+    rows.sort(key=SORT_KEYS[opts["sort"]], reverse=opts["reverse"])
+    return rows[:opts["limit"]] if opts["limit"] else rows
+
+
+def _format_time(seconds):
+    minutes, secs = divmod(int(seconds), 60)
+    return f"{minutes}:{secs:02d}"
+
+
+def _format_rss(size):
+    for unit in ("K", "M", "G"):
+        size /= 1024
+        if size < 1024 or unit == "G":
+            return f"{size:.0f}{unit}" if size >= 10 else f"{size:.1f}{unit}"
+
+
+def _table(rows, width):
+    lines = [f"{'PID':>7} {'USER':<10} S {'%CPU':>5} {'%MEM':>5} {'RSS':>6} {'THR':>4} {'TIME':>8} COMMAND"]
+    for r in rows:
+        lines.append(f"{r['pid']:>7} {r['user'][:10]:<10} {r['state']} {r['cpu']:>5.1f} {r['mem']:>5.1f} "
+                     f"{_format_rss(r['rss']):>6} {r['threads']:>4} {_format_time(r['time']):>8} {r['name']}")
+    return [line[:width] for line in lines]
+
+
+def _check_proc(name):
+    if not os.path.isdir(f"{PROC}/self"):
+        print(f"{name}: /proc is not available on this system")
+        return False
+    return True
+
+
+def ps(shell, args):
+    """List processes. Usage: ps [-u user] [-p pid,...] [--name text] [--sort key] [--limit N] [-f] [--json]"""
+    if not _check_proc("ps"):
+        return 1
+    try:
+        opts = _parse_args("ps", args, "pid")
+    except ValueError as e:
+        print(f"ps: {e}")
+        return 2
+    reader = ProcReader(with_cmdline=opts["full"])
+    reader.max_fds = 0  # a single sample gains nothing from keeping fds open
+    rows = _select(reader.sample(), opts)
+    if opts["json"]:
+        shell.out.line(json.dumps(rows))
+    else:
+        shell.out.lines(_table(rows, shell.out.width if shell.out.is_tty else 1 << 16))
+
+
+def _header(rows):
+    try:
+        load = os.getloadavg()
+    except OSError:
+        load = (0.0, 0.0, 0.0)
+    mem = _meminfo()
+    used = (mem.get("MemTotal", 0) - mem.get("MemAvailable", 0)) // 1024
+    up = int(_uptime())
+    return [
+        f"top - {time.strftime('%H:%M:%S')} up {up // 86400}d {up % 86400 // 3600:02d}:{up % 3600 // 60:02d}, "
+        f"load average: {load[0]:.2f} {load[1]:.2f} {load[2]:.2f}",
+        f"Tasks: {len(rows)}, running: {sum(r['state'] == 'R' for r in rows)}   "
+        f"Mem: {used} MiB used / {mem.get('MemTotal', 0) // 1024} MiB",
+        "",
+    ]
+
+
+class _Screen:
+    """Redraws only the terminal rows that changed since the previous frame."""
+
+    def __init__(self, out):
+        self.out = out
+        self.previous = []
+
+    def draw(self, lines):
+        write = self.out.write
+        if not self.previous:
+            write("\033[?1049h\033[?25l\033[2J")
+        for row, line in enumerate(lines):
+            if row >= len(self.previous) or self.previous[row] != line:
+                write(f"\033[{row + 1};1H{line}\033[K")
+        if len(lines) < len(self.previous):
+            write(f"\033[{len(lines) + 1};1H\033[J")
+        self.previous = lines
+        self.out.flush()
+
+    def close(self):
+        if self.previous:
+            self.out.write("\033[?25h\033[?1049l")
+            self.out.flush()
+
+
+def top(shell, args):
+    """Continuously refresh the busiest processes until Ctrl+C.
+
+    Usage: top [-d seconds] [-n iterations] [-u user] [--name text] [--sort key] [-f] [--json]
+    """
+    if not _check_proc("top"):
+        return 1
+    try:
+        opts = _parse_args("top", args, "cpu")
+    except ValueError as e:
+        print(f"top: {e}")
+        return 2
+    out = shell.out
+    reader = ProcReader(with_cmdline=opts["full"])
+    try:
+        reader.sample()
+        if opts["json"]:
+            # one interval so CPU figures are deltas rather than lifetime averages
+            if not shell.cancel_event.wait(min(opts["delay"], 1.0)):
+                out.line(json.dumps(_select(reader.sample(), opts)))
+            return
+        out.disable_truncation()
+        screen = _Screen(out) if out.is_tty else None
+        iterations = opts["iterations"] or (0 if screen else 1)
+        count = 0
+        try:
+            while True:
+                if shell.cancel_event.wait(opts["delay"] if count else min(opts["delay"], 0.5)):
+                    break
+                rows = reader.sample()
+                size = shutil.get_terminal_size()
+                header = _header(rows)
+                table = _table(_select(rows, opts), size.columns)
+                if screen:
+                    screen.draw(header + table[:max(1, size.lines - len(header) - 1)])
+                else:
+                    out.lines(header + table)
+                count += 1
+                if iterations and count >= iterations:
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if screen:
+                screen.close()
+    finally:
+        reader.close()
@@ -0,0 +1,220 @@
+"""Session recording and non-interactive replay for spotting latency regressions.
+
+A recording is JSONL: a header line, then one line per command with the working
+directory, time since start, latency, output size, output hash, exit status and,
+with --output, the output text itself.
+"""
+
+import os
+import io
+import json
+import time
+import difflib
+import hashlib
+
+FORMAT_VERSION = 1
+# commands that control recording or the shell itself are never replayed
+SKIP = {"record", "replay", "exit", "q", "quit", "restart", "run"}
+
+
+class Recorder:
+    """Appends one JSON line per command to the recording file."""
+
+    def __init__(self, shell, path, keep_output=False):
+        self.shell = shell
+        self.path = path
+        self.keep_output = keep_output
+        self.started = time.time()
+        self.count = 0
+        self._f = open(path, 'w', encoding='utf-8', buffering=1)
+        self._write({"version": FORMAT_VERSION, "started": self.started, "cwd": os.getcwd(),
+                     "shell": shell.version_info.get("number", "unknown")})
+        self._reset()
+
+    def _write(self, obj):
+        self._f.write(json.dumps(obj, separators=(",", ":")) + "\n")
+
+    def _reset(self):
+        self._hash = hashlib.sha1()
+        self._size = 0
+        self._chunks = [] if self.keep_output else None
+
+    def _sink(self, text):
+        data = text.encode('utf-8', errors='replace')
+        self._hash.update(data)
+        self._size += len(data)
+        if self._chunks is not None:
+            self._chunks.append(text)
+
+    def begin(self):
+        """Start capturing the output of the next command."""
+        self._reset()
+        self.shell.out.tee = self._sink
+
+    def log(self, line, cwd, started, elapsed, status):
+        self.shell.out.tee = None
+        entry = {"t": round(started - self.started, 4), "cwd": cwd, "line": line,
+                 "elapsed": round(elapsed, 6), "bytes": self._size,
+                 "sha1": self._hash.hexdigest(), "status": status}
+        if self._chunks is not None:
+            entry["output"] = "".join(self._chunks)
+        self._write(entry)
+        self.count += 1
+
+    def close(self):
+        self.shell.out.tee = None
+        self._f.close()
+
+
+def record(shell, args):
+    """Record this session's commands. Usage: record start [file] [--output] | stop | status"""
+    action = args[0] if args else "status"
+    if action == "start":
+        if shell.recorder is not None:
+            print(f"record: already recording to {shell.recorder.path}")
+            return 1
+        names = [a for a in args[1:] if not a.startswith("--")]
+        path = names[0] if names else time.strftime("session-%Y%m%d-%H%M%S.jsonl")
+        try:
+            shell.recorder = Recorder(shell, path, keep_output="--output" in args)
+        except OSError as e:
+            print(f"record: {path}: {e}")
+            return 1
+        print(f"Recording to {path}. Use 'record stop' to finish.")
+    elif action == "stop":
+        if shell.recorder is None:
+            print("record: not recording")
+            return 1
+        recorder, shell.recorder = shell.recorder, None
+        recorder.close()
+        print(f"Recorded {recorder.count} commands to {recorder.path}.")
+    elif action == "status":
+        if shell.recorder is None:
+            print("Not recording.")
+        else:
+            print(f"Recording to {shell.recorder.path} ({shell.recorder.count} commands so far).")
+    else:
+        print("Usage: record start [file] [--output] | record stop | record status")
+        return 2
+
+
+def _load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        header = json.loads(f.readline() or "{}")
+        entries = [json.loads(line) for line in f if line.strip()]
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"unsupported recording format {header.get('version')!r}")
+    return header, entries
+
+
+def _parse_replay_args(args):
+    opts = {"speed": 0.0, "threshold": 50.0, "min_ms": 5.0, "compare": False, "diff": False, "show": False}
+    files = []
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a in ("--speed", "--threshold", "--min-ms") and i + 1 < len(args):
+            opts[a[2:].replace("-", "_")] = float(args[i + 1])
+            i += 2
+            continue
+        if a == "--compare-timings":
+            opts["compare"] = True
+        elif a == "--diff":
+            opts["diff"] = True
+        elif a == "--show":
+            opts["show"] = True
+        else:
+            files.append(a)
+        i += 1
+    return files, opts
+
+
+def replay(shell, args):
+    """Re-run a recorded session and report latency regressions.
+
+    Usage: replay <file> [--speed X] [--compare-timings] [--diff] [--threshold PCT] [--min-ms N] [--show]
+    --speed paces commands at X times the recorded rate (0, the default, runs them back to back).
+    """
+    try:
+        files, opts = _parse_replay_args(args)
+    except ValueError as e:
+        print(f"replay: {e}")
+        return 2
+    if len(files) != 1:
+        print("Usage: replay <file> [--speed X] [--compare-timings] [--diff] [--threshold PCT] [--min-ms N] [--show]")
+        return 2
+    try:
+        header, entries = _load(files[0])
+    except (OSError, ValueError) as e:
+        print(f"replay: {files[0]}: {e}")
+        return 1
+
+    out = shell.out
+    start_dir = os.getcwd()
+    began = time.perf_counter()
+    results = []
+    try:
+        for entry in entries:
+            if shell.cancel_event.is_set():
+                print("replay: cancelled")
+                break
+            line = entry.get("line", "")
+            if not line.split() or line.split()[0] in SKIP:
+                continue
+            if opts["speed"] > 0:
+                delay = entry.get("t", 0) / opts["speed"] - (time.perf_counter() - began)
+                if delay > 0 and shell.cancel_event.wait(delay):
+                    continue
+            cwd = entry.get("cwd")
+            if cwd and os.path.isdir(cwd):
+                os.chdir(cwd)
+            capture = io.StringIO()
+            t0 = time.perf_counter()
+            with out.redirect(capture):
+                status = shell.execute(line)
+            elapsed = time.perf_counter() - t0
+            text = capture.getvalue()
+            if opts["show"]:
+                out.write(text)
+            results.append((entry, elapsed, status, text))
+    finally:
+        os.chdir(start_dir)
+
+    lines = [f"Replayed {len(results)} commands from {files[0]} in {time.perf_counter() - began:.2f}s."]
+    if opts["compare"]:
+        lines.append(f"{'recorded':>10} {'replayed':>10} {'change':>8}  command")
+        for entry, elapsed, _, _ in results:
+            before = entry.get("elapsed", 0.0)
+            change = f"{(elapsed / before - 1) * 100:+.0f}%" if before else "n/a"
+            lines.append(f"{before * 1000:>8.1f}ms {elapsed * 1000:>8.1f}ms {change:>8}  {entry['line']}")
+
+    regressions = []
+    for entry, elapsed, _, _ in results:
+        before = entry.get("elapsed", 0.0)
+        if (elapsed - before) * 1000 >= opts["min_ms"] and elapsed > before * (1 + opts["threshold"] / 100):
+            regressions.append((elapsed / before if before else float("inf"), entry, elapsed))
+    if regressions:
+        lines.append(f"{len(regressions)} command(s) slower than recorded by more than {opts['threshold']:g}%:")
+        for ratio, entry, elapsed in sorted(regressions, key=lambda r: r[0], reverse=True):
+            lines.append(f" - {entry['line']}: {entry.get('elapsed', 0) * 1000:.1f}ms -> {elapsed * 1000:.1f}ms ({ratio:.1f}x)")
+    else:
+        lines.append("No latency regressions.")
+
+    mismatches = 0
+    for entry, _, status, text in results:
+        data = text.encode('utf-8', errors='replace')
+        if status != entry.get("status"):
+            mismatches += 1
+            lines.append(f"status changed for '{entry['line']}': {entry.get('status')} -> {status}")
+        if hashlib.sha1(data).hexdigest() == entry.get("sha1"):
+            continue
+        mismatches += 1
+        if opts["diff"] and "output" in entry:
+            lines.extend(d.rstrip("\n") for d in difflib.unified_diff(
+                entry["output"].splitlines(), text.splitlines(), "recorded", "replayed", lineterm=""))
+        elif opts["diff"]:
+            lines.append(f"output changed for '{entry['line']}': {entry.get('bytes')} -> {len(data)} bytes")
+    if opts["diff"] and not mismatches:
+        lines.append("All outputs and exit statuses match.")
+    out.lines(lines)
+    return 1 if regressions or (opts["diff"] and mismatches) else 0
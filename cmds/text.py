@@ -0,0 +1,456 @@
+"""Streaming text-processing commands: wc, head, tail, grep, sort and uniq.
+
+Every command reads its files in binary chunks, or the output of the previous
+pipeline stage (``shell.stdin``) when no files are given. They return 1 when a
+file could not be read or an option is invalid (grep: 1 for no match, 2 for errors).
+"""
+
+import os
+import re
+import io
+import heapq
+import tempfile
+from collections import deque
+
+# most sorted runs merged (and so held open) at once
+MERGE_FAN_IN = 64
+
+
+def _input_streams(shell, name, files, errors):
+    """Yield (label, binary file) pairs for the given files, or the piped input if none were given.
+
+    Files that cannot be opened are reported and appended to errors.
+    """
+    if not files:
+        if shell.stdin is None:
+            print(f"{name}: missing file operand")
+            errors.append(None)
+            return
+        yield "-", shell.stdin
+        return
+    for filename in files:
+        try:
+            f = open(filename, 'rb')
+        except FileNotFoundError:
+            print(f"{name}: {filename}: No such file or directory")
+            errors.append(filename)
+            continue
+        except Exception as e:
+            print(f"{name}: {filename}: {e}")
+            errors.append(filename)
+            continue
+        with f:
+            yield filename, f
+
+
+def _write_lines(shell, lines):
+    """Write raw byte lines to stdout, decoding lazily."""
+    out = shell.out
+    cancel = shell.cancel_event
+    for line in lines:
+        if cancel.is_set():
+            return
+        text = line.decode('utf-8', errors='replace')
+        out.write(text if text.endswith("\n") else text + "\n")
+
+
+def _parse_count(name, args, default=10):
+    """Split '-n N' / '-N' off args. Returns (count, remaining args) or (None, None) on error."""
+    count = default
+    rest = []
+    i = 0
+    while i < len(args):
+        a = args[i]
+        try:
+            if a == "-n" and i + 1 < len(args):
+                count = int(args[i + 1])
+                i += 2
+                continue
+            if a.startswith("-n") and len(a) > 2:
+                count = int(a[2:])
+            elif len(a) > 1 and a[0] == "-" and a[1:].isdigit():
+                count = int(a[1:])
+            else:
+                rest.append(a)
+        except ValueError:
+            print(f"{name}: invalid number of lines: '{a}'")
+            return None, None
+        i += 1
+    return count, rest
+
+
+def wc(shell, args):
+    """Count lines, words and bytes. Usage: wc [-l] [-w] [-c] [file ...]"""
+    flags = {a for a in args if a.startswith("-") and len(a) > 1}
+    files = [a for a in args if a not in flags]
+    show = {c for f in flags for c in f[1:] if c in "lwc"} or set("lwc")
+    totals = [0, 0, 0]
+    counted = 0
+    errors = []
+    for label, f in _input_streams(shell, "wc", files, errors):
+        lines = words = size = 0
+        in_word = False
+        while True:
+            chunk = f.read(1 << 20)
+            if not chunk or shell.cancel_event.is_set():
+                break
+            size += len(chunk)
+            lines += chunk.count(b"\n")
+            words += len(chunk.split())
+            # a word straddling the chunk boundary was counted twice
+            if in_word and not chunk[:1].isspace():
+                words -= 1
+            in_word = not chunk[-1:].isspace()
+        counts = [lines, words, size]
+        totals = [t + c for t, c in zip(totals, counts)]
+        counted += 1
+        print(_format_wc(counts, show, "" if label == "-" else label))
+    if counted > 1:
+        print(_format_wc(totals, show, "total"))
+    return 1 if errors else 0
+
+
+def _format_wc(counts, show, label):
+    cols = [f"{n:>7}" for n, flag in zip(counts, "lwc") if flag in show]
+    return " ".join(cols + ([label] if label else []))
+
+
+def head(shell, args):
+    """Print the first lines of files. Usage: head [-n N] [file ...]"""
+    count, files = _parse_count("head", args)
+    if count is None:
+        return 1
+    errors = []
+    for index, (label, f) in enumerate(_input_streams(shell, "head", files, errors)):
+        if len(files) > 1:
+            print(("\n" if index else "") + f"==> {label} <==")
+        lines = []
+        for line in f:
+            if len(lines) >= count or shell.cancel_event.is_set():
+                break
+            lines.append(line)
+        _write_lines(shell, lines)
+    return 1 if errors else 0
+
+
+def _tail_lines(f, count):
+    """Return the last `count` lines, seeking backwards on regular files instead of reading everything."""
+    if count <= 0:
+        return []
+    try:
+        end = f.seek(0, os.SEEK_END)
+    except (OSError, io.UnsupportedOperation):
+        return list(deque(f, maxlen=count))
+    block = 64 * 1024
+    pos = end
+    data = b""
+    # one extra newline is needed unless the file lacks a trailing one
+    while pos > 0 and data.count(b"\n") <= count:
+        step = min(block, pos)
+        pos -= step
+        f.seek(pos)
+        data = f.read(step) + data
+    lines = data.splitlines(keepends=True)
+    f.seek(end)
+    return lines[-count:]
+
+
+def tail(shell, args):
+    """Print the last lines of files, optionally following growth. Usage: tail [-n N] [-f] [file ...]"""
+    follow = "-f" in args
+    count, files = _parse_count("tail", [a for a in args if a != "-f"])
+    if count is None:
+        return 1
+    if follow and len(files) != 1:
+        print("tail: -f requires exactly one file")
+        return 1
+    errors = []
+    for index, (label, f) in enumerate(_input_streams(shell, "tail", files, errors)):
+        if len(files) > 1:
+            print(("\n" if index else "") + f"==> {label} <==")
+        _write_lines(shell, _tail_lines(f, count))
+        if follow:
+            shell.out.disable_truncation()
+            shell.out.flush()
+            _follow(shell, label, f)
+    return 1 if errors else 0
+
+
+def _follow(shell, path, f):
+    """Poll a file with os.stat and print appended data until cancelled; reopens on truncation or rotation."""
+    try:
+        ino = os.fstat(f.fileno()).st_ino
+        while not shell.cancel_event.is_set():
+            data = f.read()
+            if data:
+                shell.out.write(data.decode('utf-8', errors='replace'))
+                shell.out.flush()
+                continue
+            if shell.cancel_event.wait(0.25):
+                break
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if st.st_ino != ino:
+                # file was rotated: continue from the start of the new one
+                f.close()
+                f = open(path, 'rb')
+                ino = os.fstat(f.fileno()).st_ino
+            elif st.st_size < f.tell():
+                print(f"tail: {path}: file truncated")
+                f.seek(0)
+    except KeyboardInterrupt:
+        print()
+
+
+def grep(shell, args):
+    """Search for a regex in files. Usage: grep [-i] [-v] [-n] [-c] [-l] [-F] pattern [file ...]"""
+    flags = set()
+    rest = []
+    for a in args:
+        if a.startswith("-") and len(a) > 1 and not rest:
+            flags.update(a[1:])
+        else:
+            rest.append(a)
+    if not rest:
+        print("Usage: grep [-i] [-v] [-n] [-c] [-l] [-F] pattern [file ...]")
+        return 2
+    pattern, files = rest[0].encode('utf-8'), rest[1:]
+    if "F" in flags:
+        pattern = re.escape(pattern)
+    try:
+        rx = re.compile(pattern, re.MULTILINE | (re.IGNORECASE if "i" in flags else 0))
+    except re.error as e:
+        print(f"grep: invalid pattern: {e}")
+        return 2
+    multi = len(files) > 1
+    errors = []
+    found = False
+    for label, f in _input_streams(shell, "grep", files, errors):
+        prefix = f"{label}:" if multi else ""
+        matches = 0
+        for lineno, line in _grep_stream(f, rx, "v" in flags, shell.cancel_event):
+            matches += 1
+            if "l" in flags:
+                break
+            if "c" not in flags:
+                num = f"{lineno}:" if "n" in flags else ""
+                shell.out.write(prefix + num + line.decode('utf-8', errors='replace') + "\n")
+        found = found or matches > 0
+        if "l" in flags and matches:
+            print(label)
+        elif "c" in flags:
+            print(f"{prefix}{matches}")
+    # like POSIX grep: 0 if a line was selected, 1 if none, 2 on errors
+    return 2 if errors else 0 if found else 1
+
+
+def _grep_stream(f, rx, invert, cancel, chunk_size=1 << 20):
+    """Yield (line number, line) for matching lines, scanning whole chunks with the compiled regex."""
+    leftover = b""
+    base = 1  # line number of the first line in the current block
+    while not cancel.is_set():
+        chunk = f.read(chunk_size)
+        data = leftover + chunk
+        if not data:
+            return
+        if chunk:
+            cut = data.rfind(b"\n")
+            if cut < 0:
+                leftover = data
+                continue
+            block, leftover = data[:cut + 1], data[cut + 1:]
+        else:
+            block, leftover = data + b"\n", b""
+        if invert:
+            for offset, line in enumerate(block.split(b"\n")[:-1]):
+                if not rx.search(line):
+                    yield base + offset, line
+        else:
+            pos = counted = 0
+            lineno = base
+            while True:
+                m = rx.search(block, pos)
+                # the block ends with a newline, so a match at its very end is past the last line
+                if not m or m.start() >= len(block):
+                    break
+                start = block.rfind(b"\n", 0, m.start()) + 1
+                end = block.find(b"\n", m.start())
+                pos = end + 1
+                line = block[start:end]
+                # a chunk-level match may span lines; only report lines that match on their own
+                if not rx.search(line):
+                    continue
+                lineno += block.count(b"\n", counted, start)
+                counted = start
+                yield lineno, line
+        base += block.count(b"\n")
+        if not chunk:
+            return
+
+
+def _parse_size(text):
+    """Parse sizes like '512K', '64M' or '1G' into bytes."""
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    text = text.strip().upper()
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def _sort_key(numeric, fold):
+    number = re.compile(rb"\s*[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+    def key(line):
+        if numeric:
+            m = number.match(line)
+            return (float(m.group()) if m else 0.0, line)
+        return line.lower() if fold else line
+    return key
+
+
+def sort(shell, args):
+    """Sort lines using an external merge sort. Usage: sort [-r] [-n] [-u] [-f] [-S size] [file ...]"""
+    flags = set()
+    files = []
+    cap = int(shell.sort_memory_mb * (1 << 20))
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a == "-S" and i + 1 < len(args):
+            try:
+                cap = _parse_size(args[i + 1])
+            except ValueError:
+                print(f"sort: invalid buffer size: '{args[i + 1]}'")
+                return 1
+            i += 2
+            continue
+        if a.startswith("-") and len(a) > 1:
+            flags.update(a[1:])
+        else:
+            files.append(a)
+        i += 1
+    reverse = "r" in flags
+    key = _sort_key("n" in flags, "f" in flags)
+    levels = []  # levels[i] holds runs that have been through i merge passes
+    chunk = []
+    used = 0
+    cancel = shell.cancel_event
+    errors = []
+    try:
+        for _, f in _input_streams(shell, "sort", files, errors):
+            for line in f:
+                if cancel.is_set():
+                    return 130
+                if not line.endswith(b"\n"):
+                    line += b"\n"
+                chunk.append(line)
+                # rough per-line overhead of the bytes object and list slot
+                used += len(line) + 64
+                if used >= cap:
+                    _add_run(levels, _spill_run(chunk, key, reverse), key, reverse)
+                    chunk = []
+                    used = 0
+        chunk.sort(key=key, reverse=reverse)
+        if levels:
+            if chunk:
+                _add_run(levels, _spill_run(chunk, key, reverse), key, reverse)
+            merged = heapq.merge(*_final_runs(levels, key, reverse), key=key, reverse=reverse)
+        else:
+            merged = chunk
+        if "u" in flags:
+            # -n compares only the numeric prefix when dropping duplicates
+            same = (lambda line: key(line)[0]) if "n" in flags else key
+            merged = _unique_sorted(merged, same)
+        _write_lines(shell, merged)
+    finally:
+        for runs in levels:
+            for run in runs:
+                run.close()
+    return 1 if errors else 0
+
+
+def _spill_run(lines, key, reverse):
+    """Sort lines in memory and write them to a temp file, returned rewound for merging."""
+    lines.sort(key=key, reverse=reverse)
+    run = tempfile.TemporaryFile(prefix="mycmd-sort-")
+    run.writelines(lines)
+    run.seek(0)
+    return run
+
+
+def _merge_level(levels, level, key, reverse):
+    """Merge all runs of one level into a single new run, closing the inputs."""
+    runs = levels[level]
+    merged = tempfile.TemporaryFile(prefix="mycmd-sort-")
+    merged.writelines(heapq.merge(*runs, key=key, reverse=reverse))
+    merged.seek(0)
+    for run in runs:
+        run.close()
+    levels[level] = []
+    return merged
+
+
+def _add_run(levels, run, key, reverse, level=0):
+    """Add a sorted run; a level that reaches MERGE_FAN_IN runs is merged into one run of the next level."""
+    while True:
+        if level == len(levels):
+            levels.append([])
+        levels[level].append(run)
+        if len(levels[level]) < MERGE_FAN_IN:
+            return
+        run = _merge_level(levels, level, key, reverse)
+        level += 1
+
+
+def _final_runs(levels, key, reverse):
+    """Collapse the lowest levels until the remaining runs fit in one MERGE_FAN_IN-way merge."""
+    for level in range(len(levels) - 1):
+        if sum(map(len, levels)) <= MERGE_FAN_IN:
+            break
+        if levels[level]:
+            _add_run(levels, _merge_level(levels, level, key, reverse), key, reverse, level + 1)
+    return [run for runs in levels for run in runs]
+
+
+def _unique_sorted(lines, key):
+    last = object()
+    for line in lines:
+        k = key(line)
+        if k != last:
+            last = k
+            yield line
+
+
+def uniq(shell, args):
+    """Collapse adjacent duplicate lines. Usage: uniq [-c] [-d] [-u] [-i] [file]"""
+    flags = {c for a in args if a.startswith("-") and len(a) > 1 for c in a[1:]}
+    files = [a for a in args if not (a.startswith("-") and len(a) > 1)]
+    fold = "i" in flags
+    out = shell.out
+
+    def emit(line, n):
+        if ("d" in flags and n < 2) or ("u" in flags and n > 1):
+            return
+        text = line.decode('utf-8', errors='replace').rstrip("\n")
+        out.write(f"{n:>7} {text}\n" if "c" in flags else text + "\n")
+
+    errors = []
+    for _, f in _input_streams(shell, "uniq", files[:1], errors):
+        prev = prev_key = None
+        n = 0
+        for line in f:
+            if shell.cancel_event.is_set():
+                return 130
+            k = line.rstrip(b"\n")
+            k = k.lower() if fold else k
+            if k == prev_key:
+                n += 1
+                continue
+            if prev is not None:
+                emit(prev, n)
+            prev, prev_key, n = line, k, 1
+        if prev is not None:
+            emit(prev, n)
+    return 1 if errors else 0
@@ -0,0 +1,226 @@
+"""Self-update: check the release endpoint, download, verify, extract and swap files in."""
+
+import os
+import sys
+import shutil
+import hashlib
+import zipfile
+import tempfile
+
+DEFAULT_RELEASE_URL = "https://api.github.com/repos/Ovilli/own_cmd/releases/latest"
+CHUNK_SIZE = 64 * 1024
+# user configuration is never overwritten by a release
+PRESERVE = {"data.json"}
+
+
+class UpdateError(Exception):
+    pass
+
+
+def install_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def release_url(shell):
+    return shell.config.get("settings", {}).get("update_url") or DEFAULT_RELEASE_URL
+
+
+def fetch_release(shell):
+    """Return (latest version, release data) from the configured endpoint."""
+    import requests
+    response = requests.get(release_url(shell), timeout=10)
+    if response.status_code != 200:
+        raise UpdateError(f"release endpoint returned HTTP {response.status_code}")
+    data = response.json()
+    return data.get("tag_name", "").lstrip("v"), data
+
+
+def check_for_update(shell):
+    """Return the latest version if it differs from the running one, else None."""
+    latest, _ = fetch_release(shell)
+    current = shell.version_info.get("number", "0.0.0")
+    return latest if latest and latest != current else None
+
+
+def expected_digest(asset, assets):
+    """sha256 for the asset, from the release's digest field or a sibling '<name>.sha256' asset."""
+    digest = asset.get("digest") or ""
+    if digest.startswith("sha256:"):
+        return digest.split(":", 1)[1].lower()
+    import requests
+    for other in assets:
+        if other.get("name") == asset.get("name", "") + ".sha256":
+            response = requests.get(other.get("browser_download_url"), timeout=10)
+            if response.status_code == 200 and response.text.split():
+                return response.text.split()[0].lower()
+    return None
+
+
+def download(url, dest, progress=None):
+    """Stream url into dest, resuming from dest + '.part' with an HTTP Range request. Returns the sha256 hex digest."""
+    import requests
+    part = dest + ".part"
+    sha = hashlib.sha256()
+    offset = 0
+    if os.path.exists(part):
+        # re-hash what we already have so the final digest covers the whole file
+        with open(part, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                sha.update(chunk)
+                offset += len(chunk)
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    with requests.get(url, headers=headers, stream=True, timeout=30) as response:
+        if response.status_code == 416:
+            # the partial file is already complete
+            pass
+        elif response.status_code == 206 and offset:
+            mode = 'ab'
+        elif response.status_code == 200:
+            mode = 'wb'
+            sha = hashlib.sha256()
+            offset = 0
+        else:
+            raise UpdateError(f"download failed with HTTP {response.status_code}")
+        if response.status_code != 416:
+            total = response.headers.get("Content-Length")
+            total = int(total) + offset if total and total.isdigit() else None
+            with open(part, mode) as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    sha.update(chunk)
+                    offset += len(chunk)
+                    if progress:
+                        progress(offset, total)
+    os.replace(part, dest)
+    return sha.hexdigest()
+
+
+def extract(zip_path, dest):
+    """Stream every member into dest, stripping a shared top-level folder. Returns the relative file paths."""
+    with zipfile.ZipFile(zip_path) as zf:
+        members = [m for m in zf.infolist() if not m.is_dir()]
+        tops = {m.filename.split("/", 1)[0] for m in members}
+        strip = len(tops) == 1 and all("/" in m.filename for m in members)
+        files = []
+        root = os.path.realpath(dest)
+        for member in members:
+            name = member.filename.split("/", 1)[1] if strip else member.filename
+            target = os.path.realpath(os.path.join(dest, name))
+            if not target.startswith(root + os.sep):
+                raise UpdateError(f"refusing to extract '{member.filename}' outside the update folder")
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with zf.open(member) as src, open(target, 'wb') as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            files.append(name)
+    return files
+
+
+def swap_in(staging, files, target_dir):
+    """Move staged files over the installation, restoring the originals if anything fails.
+
+    The backup of the originals is only deleted once they are either replaced or
+    fully restored; if the rollback itself fails it is kept and named in the error.
+    """
+    backup = tempfile.mkdtemp(prefix=".mycmd-backup-", dir=target_dir)
+    moved = []  # (installed path, backup path or None for new files)
+    try:
+        for name in files:
+            if name in PRESERVE:
+                continue
+            dst = os.path.join(target_dir, name)
+            saved = None
+            if os.path.exists(dst):
+                saved = os.path.join(backup, name)
+                os.makedirs(os.path.dirname(saved), exist_ok=True)
+                os.replace(dst, saved)
+            moved.append((dst, saved))
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            os.replace(os.path.join(staging, name), dst)
+    except Exception as e:
+        failed = []
+        for dst, saved in reversed(moved):
+            try:
+                if saved:
+                    os.replace(saved, dst)
+                elif os.path.exists(dst):
+                    os.remove(dst)
+            except OSError:
+                failed.append(dst)
+        if failed:
+            raise UpdateError(f"{e}; could not restore {', '.join(failed)}, originals kept in {backup}") from e
+        shutil.rmtree(backup, ignore_errors=True)
+        raise
+    shutil.rmtree(backup, ignore_errors=True)
+
+
+def update(shell, args):
+    """Update MyCMD to the latest release. Usage: update [check] [--no-verify]"""
+    print("Checking for updates...")
+    try:
+        latest, data = fetch_release(shell)
+    except ImportError:
+        print("update: requests module not installed. Install it via 'pip install requests'.")
+        return 1
+    except Exception as e:
+        print(f"Update failed: {e}")
+        return 1
+    current = shell.version_info.get("number", "0.0.0")
+    if not latest or latest == current:
+        print("You are already using the latest version.")
+        return
+    print(f"New version available: {latest} (current: {current})")
+    if "check" in args:
+        return
+    assets = data.get("assets", [])
+    asset = next((a for a in assets if a.get("name", "").endswith(".zip")), None)
+    if asset is None:
+        print("No downloadable assets found for the latest release.")
+        return 1
+
+    if sys.stdin.isatty():
+        try:
+            ans = input(f"Install {latest} now? [Y/n] ").strip().lower()
+            if ans and ans[0] == "n":
+                print("Update cancelled.")
+                return
+        except Exception:
+            pass
+
+    target_dir = install_dir()
+    zip_path = os.path.join(target_dir, f"mycmd_update-{latest}.zip")
+    out = shell.out
+
+    def progress(done, total):
+        if out.is_tty and total:
+            out.write(f"\r{done * 100 // total:3d}% of {total // 1024} KiB")
+
+    try:
+        url = asset.get("browser_download_url")
+        print(f"Downloading update from {url}...")
+        digest = download(url, zip_path, progress)
+        if out.is_tty:
+            out.line()
+        expected = expected_digest(asset, assets)
+        if expected is None:
+            if "--no-verify" not in args:
+                os.remove(zip_path)
+                raise UpdateError("no checksum published for this release; run 'update --no-verify' to install it unverified")
+            print("update: no checksum published for this release; installing unverified (--no-verify).")
+        elif digest != expected:
+            os.remove(zip_path)
+            raise UpdateError(f"checksum mismatch (expected {expected}, got {digest})")
+        staging = tempfile.mkdtemp(prefix=".mycmd-update-", dir=target_dir)
+        try:
+            files = extract(zip_path, staging)
+            swap_in(staging, files, target_dir)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        os.remove(zip_path)
+    except Exception as e:
+        print(f"Update failed: {e}")
+        return 1
+
+    shell.version_info["number"] = latest
+    shell.config["version"] = shell.version_info
+    shell.save_config()
+    print(f"Updated to {latest}. Run 'restart' to use the new version.")
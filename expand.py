@@ -0,0 +1,258 @@
+"""Word expansion for MyCMD command lines.
+
+lex() splits a line into words using POSIX shell quoting, keeping track of which
+parts were quoted; MyCMD.expand() then substitutes variables and commands and
+expands globs with glob_cached(). Directory listings are cached by mtime and
+shared with the shell's tab completion.
+"""
+
+import os
+import re
+import fnmatch
+
+
+# directory listings used by the completers: abspath -> (mtime_ns, [(name, is_dir)])
+_dir_cache = {}
+_DIR_CACHE_SIZE = 256
+
+
+def scan_dir(path):
+    """List a directory into the cache and return its [(name, is_dir)] entries."""
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+    with os.scandir(path) as it:
+        entries = [(entry.name, entry.is_dir()) for entry in it]
+    _dir_cache.pop(path, None)
+    if len(_dir_cache) >= _DIR_CACHE_SIZE:
+        _dir_cache.pop(next(iter(_dir_cache)))
+    _dir_cache[path] = (mtime, entries)
+    return entries
+
+
+def cached_listing(path):
+    """Entries of a directory from the cache, scanning it only if it has never been listed."""
+    cached = _dir_cache.get(os.path.abspath(path))
+    return cached[1] if cached else scan_dir(path)
+
+
+def refresh_dir_cache():
+    """Rescan cached directories whose mtime changed, so completion never waits on the disk."""
+    for path, (mtime, _) in list(_dir_cache.items()):
+        try:
+            if os.stat(path).st_mtime_ns != mtime:
+                scan_dir(path)
+        except OSError:
+            _dir_cache.pop(path, None)
+
+
+# glob matches memoized per (directory, mtime, pattern); listings come from _dir_cache
+_glob_cache = {}
+_GLOB_CACHE_SIZE = 1024
+
+
+def _listing(path):
+    """Return (abspath, mtime_ns, entries), rescanning only when the directory's mtime changed."""
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _dir_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        scan_dir(path)
+        cached = _dir_cache[path]
+    return path, cached[0], cached[1]
+
+
+def _match_dir(dir_path, pattern, dirs_only=False):
+    try:
+        path, mtime, entries = _listing(dir_path)
+    except OSError:
+        return []
+    key = (path, mtime, pattern, dirs_only)
+    names = _glob_cache.get(key)
+    if names is None:
+        rx = re.compile(fnmatch.translate(pattern))
+        # like sh, wildcards only match dotfiles when the pattern itself starts with '.'
+        hidden = pattern.startswith(".")
+        names = [name for name, is_dir in entries
+                 if (is_dir or not dirs_only) and (hidden or name[0] != ".") and rx.match(name)]
+        if len(_glob_cache) >= _GLOB_CACHE_SIZE:
+            _glob_cache.pop(next(iter(_glob_cache)))
+        _glob_cache[key] = names
+    return names
+
+
+def _glob_parts(prefix, parts, seen):
+    head, rest = parts[0], parts[1:]
+    dir_path = prefix or "."
+    if head == "**":
+        # zero or more directories
+        found = _glob_parts(prefix, rest, seen) if rest else [prefix] if prefix else []
+        for name in _match_dir(dir_path, "*", dirs_only=True):
+            path = os.path.join(prefix, name)
+            real = os.path.realpath(path)
+            if real not in seen:
+                seen.add(real)
+                found += _glob_parts(path, parts, seen)
+        return found
+    if not any(c in head for c in "*?["):
+        path = os.path.join(prefix, head)
+        if rest:
+            return _glob_parts(path, rest, seen)
+        return [path] if head in _match_dir(dir_path, head) or os.path.lexists(path) else []
+    found = []
+    for name in _match_dir(dir_path, head, dirs_only=bool(rest)):
+        path = os.path.join(prefix, name)
+        found += _glob_parts(path, rest, seen) if rest else [path]
+    return found
+
+
+def glob_cached(pattern):
+    """Expand a glob pattern using cached directory listings; '**' matches any depth of directories."""
+    parts = [p for p in re.split(r"[/\\]" if os.name == 'nt' else "/", pattern) if p]
+    if not parts:
+        return []
+    prefix = os.path.sep if pattern.startswith(("/", os.path.sep)) else ""
+    return sorted(set(_glob_parts(prefix, parts, set())))
+
+
+def glob_escape(text):
+    return re.sub(r"([*?\[])", r"[\1]", text)
+
+
+def _find_close(line, i, close):
+    """Index of the ')' or '`' that closes a substitution starting at i, honoring quotes and nesting."""
+    depth = 1
+    quote = None
+    while i < len(line):
+        c = line[i]
+        if quote:
+            if c == quote:
+                quote = None
+            elif c == "\\" and quote == '"':
+                i += 1
+        elif c == "\\":
+            i += 1
+        elif c == close and close == "`":
+            return i
+        elif c in "'\"":
+            quote = c
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    raise ValueError(f"unterminated {'$(' if close == ')' else '`'}")
+
+
+_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+def _lex_dollar(line, i, quoted):
+    """Lex the expansion at line[i] == '$'. Returns (part, next index)."""
+    nxt = line[i + 1:i + 2]
+    if nxt == "(":
+        j = _find_close(line, i + 2, ")")
+        return ("sub", line[i + 2:j], quoted), j + 1
+    if nxt == "{":
+        j = line.find("}", i + 2)
+        if j < 0:
+            raise ValueError("unterminated ${")
+        return ("var", line[i + 2:j], quoted), j + 1
+    if nxt in ("?", "$"):
+        return ("var", nxt, quoted), i + 2
+    m = _NAME.match(line, i + 1)
+    if m:
+        return ("var", m.group(), quoted), m.end()
+    return ("text", "$", quoted), i + 1
+
+
+def lex(line):
+    """Split a command line into words and '|' operators using POSIX shell quoting rules.
+
+    Each word is a list of (kind, value, quoted) parts where kind is 'text', 'var',
+    'sub' (command substitution) or 'tilde'. shlex applies the same quoting rules
+    but discards which characters were quoted, which globbing and field splitting need.
+    """
+    items = []
+    word = None
+    i = 0
+    n = len(line)
+    special = " \t\n|'\"\\$`"
+    while i < n:
+        c = line[i]
+        part = None
+        if c in " \t\n":
+            if word is not None:
+                items.append(word)
+                word = None
+            i += 1
+            continue
+        if c == "|":
+            if word is not None:
+                items.append(word)
+                word = None
+            items.append("|")
+            i += 1
+            continue
+        if c == "'":
+            j = line.find("'", i + 1)
+            if j < 0:
+                raise ValueError("unterminated single quote")
+            part, i = ("text", line[i + 1:j], True), j + 1
+        elif c == '"':
+            i += 1
+            parts = [("text", "", True)]  # keeps "" as an empty argument
+            while True:
+                if i >= n:
+                    raise ValueError("unterminated double quote")
+                c = line[i]
+                if c == '"':
+                    i += 1
+                    break
+                if c == "\\" and line[i + 1:i + 2] in ('$', '`', '"', '\\'):
+                    parts.append(("text", line[i + 1], True))
+                    i += 2
+                elif c == "$":
+                    p, i = _lex_dollar(line, i, True)
+                    parts.append(p)
+                elif c == "`":
+                    j = _find_close(line, i + 1, "`")
+                    parts.append(("sub", line[i + 1:j], True))
+                    i = j + 1
+                else:
+                    j = i + 1
+                    while j < n and line[j] not in '"\\$`':
+                        j += 1
+                    parts.append(("text", line[i:j], True))
+                    i = j
+            word = (word or []) + parts
+            continue
+        elif c == "\\":
+            part, i = ("text", line[i + 1:i + 2], True), i + 2
+        elif c == "$":
+            part, i = _lex_dollar(line, i, False)
+        elif c == "`":
+            j = _find_close(line, i + 1, "`")
+            part, i = ("sub", line[i + 1:j], False), j + 1
+        elif c == "~" and word is None:
+            j = i + 1
+            while j < n and line[j] not in special and line[j] != "/":
+                j += 1
+            part, i = ("tilde", line[i + 1:j], False), j
+        else:
+            j = i + 1
+            while j < n and line[j] not in special:
+                j += 1
+            part, i = ("text", line[i:j], False), j
+        word = (word or []) + [part]
+    if word is not None:
+        items.append(word)
+    return items
+
+
+def literal(word):
+    """Return the text of a lexed word that contains no expansions, else None."""
+    if word == "|" or any(kind != "text" for kind, _, _ in word):
+        return None
+    return "".join(value for _, value, _ in word)
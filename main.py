@@ -5,13 +5,409 @@ import json
 import sys
 import shutil
 import shlex
+import codecs
+import io
+import time
+import tempfile
+import importlib
+import threading
+import asyncio
+import signal
+import contextlib
+
+from expand import lex, literal, glob_cached, glob_escape, scan_dir, cached_listing, refresh_dir_cache
+
+
+class LazyCommand:
+    """A command implemented in another module, imported the first time it is invoked.
+
+    spec is either a "package.module:function" string or an importlib entry point.
+    The function is called as function(shell, args).
+    """
+
+    def __init__(self, shell, name, spec, source="data.json"):
+        self.shell = shell
+        self.name = name
+        self.spec = spec
+        self.source = source
+        self.func = None
+        self.load_time = None
+
+    @property
+    def target(self):
+        return self.spec if isinstance(self.spec, str) else self.spec.value
+
+    def load(self):
+        if self.func is None:
+            start = time.perf_counter()
+            if isinstance(self.spec, str):
+                module_name, _, attr = self.spec.partition(":")
+                module = importlib.import_module(module_name)
+                self.func = getattr(module, attr or self.name)
+            else:
+                self.func = self.spec.load()
+            self.load_time = time.perf_counter() - start
+        return self.func
+
+    def __call__(self, args):
+        try:
+            func = self.load()
+        except Exception as e:
+            print(f"{self.name}: failed to load {self.target}: {e}")
+            return
+        return func(self.shell, args)
+
+
+class CommandRegistry(dict):
+    """Command name -> callable, plus the metadata plugins can contribute.
+
+    Builtins are stored directly; commands declared by module path or entry point
+    are wrapped in LazyCommand so their module is only imported on first use.
+    """
+
+    ENTRY_POINT_GROUP = "mycmd.commands"
+    PLUGIN_GROUP = "mycmd.plugins"
+
+    def __init__(self, shell):
+        super().__init__()
+        self.shell = shell
+        self.completers = {"files": _complete_files, "dirs": _complete_dirs}
+        # command name -> completer name
+        self.completer_for = {}
+        # usage hints and descriptions supplied by plugins (data.json entries take precedence)
+        self.usages = {}
+        self.descriptions = {}
+        # plugin module -> seconds spent importing and registering it
+        self.plugins = {}
+
+    def register(self, name, target, usage=None, description=None, completer=None, source="plugin"):
+        """Add a command. target may be a callable taking args, or a lazy module path / entry point."""
+        if isinstance(target, str) or hasattr(target, "load"):
+            target = LazyCommand(self.shell, name, target, source)
+        self[name] = target
+        if usage:
+            self.usages[name] = usage
+        if description:
+            self.descriptions[name] = description
+        if completer:
+            self.completer_for[name] = completer
+
+    def add_completer(self, name, func):
+        """Register a completer func(shell, fragment) yielding candidates for the last path component."""
+        self.completers[name] = func
+
+    def completer(self, name):
+        """Look up a completer by name; "module:function" names are imported on first use."""
+        func = self.completers.get(name)
+        if func is None and name and ":" in name:
+            module_name, _, attr = name.partition(":")
+            try:
+                func = getattr(importlib.import_module(module_name), attr)
+            except Exception:
+                return None
+            self.completers[name] = func
+        return func
+
+    def complete(self, cmd, fragment):
+        func = self.completer(self.completer_for.get(cmd))
+        if func is None:
+            return []
+        return func(self.shell, fragment)
+
+    def load_plugin(self, module_name):
+        """Import a plugin module and let its register(registry) hook add commands and completers."""
+        start = time.perf_counter()
+        try:
+            module = importlib.import_module(module_name)
+            module.register(self)
+        except Exception as e:
+            print(f"plugins: failed to load {module_name}: {e}")
+            return
+        self.plugins[module_name] = time.perf_counter() - start
+
+    def load_entry_points(self):
+        """Pick up commands and plugins installed by other packages."""
+        try:
+            from importlib.metadata import entry_points
+            eps = entry_points()
+            if hasattr(eps, "select"):
+                commands = eps.select(group=self.ENTRY_POINT_GROUP)
+                plugins = eps.select(group=self.PLUGIN_GROUP)
+            else:
+                commands = eps.get(self.ENTRY_POINT_GROUP, [])
+                plugins = eps.get(self.PLUGIN_GROUP, [])
+        except Exception:
+            return
+        for ep in commands:
+            self.register(ep.name, ep, source="entry point")
+        for ep in plugins:
+            self.load_plugin(ep.value.partition(":")[0])
+
+
+def _list_dir(fragment, dirs_only=False):
+    if os.path.sep in fragment:
+        base_dir, base = os.path.split(fragment)
+        base_dir = base_dir or '.'
+    else:
+        base_dir, base = ".", fragment
+    try:
+        entries = cached_listing(base_dir)
+    except OSError:
+        return
+    for name, is_dir in entries:
+        if name.startswith(base):
+            if is_dir:
+                yield name + os.path.sep
+            elif not dirs_only:
+                yield name
+
+
+def _complete_files(shell, fragment):
+    return _list_dir(fragment)
+
+
+def _complete_dirs(shell, fragment):
+    return _list_dir(fragment, dirs_only=True)
+
+
+class TerminalOutput(io.TextIOBase):
+    """Buffered text stream placed in front of the real stdout.
+
+    Writes are collected and flushed once the buffer fills up, once data has been
+    pending longer than flush_interval seconds (a timer covers commands that go
+    quiet), or explicitly (before each prompt).
+    Colors are only emitted when the target is a TTY.
+    """
+
+    ANSI_RESET = "\033[0m"
+    ANSI_CLEAR = "\033[2J\033[H"
+
+    def __init__(self, stream, buffer_size=1 << 16, flush_interval=0.05, max_lines=0):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        # truncate a single command's output after this many lines (0 disables)
+        self.max_lines = max_lines
+        # optional callable that sees every write, e.g. the session recorder
+        self.tee = None
+        self._chunks = []
+        self._pending = 0
+        self._since = None
+        self._timer = None
+        # builtins write from worker threads while the timer flushes from its own
+        self._lock = threading.RLock()
+        # per-thread Event; once set, that thread's writes are dropped (see mute_when)
+        self._muted = threading.local()
+        self._limit = 0
+        self._lines = 0
+        self._dropped = 0
+        self._detect()
+
+    def _detect(self):
+        try:
+            self.is_tty = self.stream.isatty()
+        except Exception:
+            self.is_tty = False
+        self._width = None
+
+    @property
+    def encoding(self):
+        return getattr(self.stream, "encoding", None) or "utf-8"
+
+    @property
+    def width(self):
+        """Terminal width in columns (80 when not attached to a terminal)."""
+        if self._width is None:
+            self._width = shutil.get_terminal_size().columns if self.is_tty else 80
+        return self._width
+
+    def fileno(self):
+        return self.stream.fileno()
+
+    def isatty(self):
+        return self.is_tty
+
+    def writable(self):
+        return True
+
+    def mute_when(self, event):
+        """Drop everything the calling thread writes once event is set (None unmutes)."""
+        self._muted.event = event
+
+    def write(self, s):
+        n = len(s)
+        muted = getattr(self._muted, "event", None)
+        if muted is not None and muted.is_set():
+            return n
+        with self._lock:
+            if self.tee is not None:
+                self.tee(s)
+            if self._limit:
+                s = self._clip(s)
+                if not s:
+                    return n
+            self._chunks.append(s)
+            self._pending += len(s)
+            now = time.monotonic()
+            if self._since is None:
+                self._since = now
+            if self._pending >= self.buffer_size or now - self._since >= self.flush_interval:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush_due)
+                self._timer.daemon = True
+                self._timer.start()
+        return n
+
+    def _flush_due(self):
+        with self._lock:
+            self._timer = None
+            if self._chunks:
+                self.flush()
+
+    def _clip(self, s):
+        """Drop whatever falls past the per-command line limit, counting the dropped lines."""
+        room = self._limit - self._lines
+        count = s.count("\n")
+        if room <= 0:
+            self._dropped += count
+            return ""
+        if count < room:
+            self._lines += count
+            return s
+        cut = -1
+        for _ in range(room):
+            cut = s.index("\n", cut + 1)
+        self._lines = self._limit
+        self._dropped += count - room
+        return s[:cut + 1]
+
+    def flush(self):
+        with self._lock:
+            if self._chunks:
+                data = "".join(self._chunks)
+                self._chunks = []
+                self._pending = 0
+                self._since = None
+                self.stream.write(data)
+            self.stream.flush()
+
+    def line(self, text=""):
+        self.write(text + "\n")
+
+    def lines(self, items):
+        """Write each item on its own line, batching them into a single buffer append."""
+        items = list(items)
+        if items:
+            self.write("\n".join(items) + "\n")
+
+    def columns(self, items):
+        """Lay items out column-major to fit the terminal width; one per line when not a TTY."""
+        items = list(items)
+        if not self.is_tty or not items:
+            self.lines(items)
+            return
+        col = max(len(item) for item in items) + 2
+        rows = -(-len(items) // max(1, self.width // col))
+        self.lines("".join(item.ljust(col) for item in items[r::rows]).rstrip() for r in range(rows))
+
+    def begin_command(self):
+        """Reset per-command state; truncation only applies when writing to a terminal."""
+        self.flush()
+        self._width = None
+        self._lines = 0
+        self._dropped = 0
+        self._limit = self.max_lines if self.is_tty else 0
+
+    def end_command(self):
+        if self._dropped:
+            self._limit = 0
+            self.write(f"... {self._dropped} more lines\n")
+        self._limit = 0
+        self.flush()
+
+    def disable_truncation(self):
+        """Let the rest of the current command through untruncated (e.g. tail -f)."""
+        self._limit = 0
+
+    @contextlib.contextmanager
+    def redirect(self, stream):
+        """Temporarily send output to another text stream, such as a pipeline spool."""
+        with self._lock:
+            self.flush()
+            saved = (self.stream, self.is_tty, self._width, self._limit, self.tee)
+            self.stream = stream
+            self._detect()
+            self._limit = 0
+            self.tee = None
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self.flush()
+                self.stream, self.is_tty, self._width, self._limit, self.tee = saved
+
+    def set_color(self, code):
+        """Apply a color code. On Windows use 'color'; on others map hex to ANSI."""
+        if not code:
+            return
+        # Windows 'color' expects two hex digits (bgfg)
+        if os.name == 'nt':
+            try:
+                self.flush()
+                os.system(f'color {code}')
+            except Exception:
+                pass
+            return
+        if not self.is_tty:
+            return
+
+        def hex_to_fg(d):
+            v = int(d, 16)
+            if v < 8:
+                return str(30 + v)
+            return str(90 + (v - 8))
+
+        def hex_to_bg(d):
+            v = int(d, 16)
+            if v < 8:
+                return str(40 + v)
+            return str(100 + (v - 8))
+
+        seq = None
+        cd = str(code)
+        if len(cd) == 2 and all(c in "0123456789abcdefABCDEF" for c in cd):
+            bg = hex_to_bg(cd[0])
+            fg = hex_to_fg(cd[1])
+            seq = f"\033[{fg};{bg}m"
+        elif len(cd) == 1 and cd in "0123456789abcdefABCDEF":
+            fg = hex_to_fg(cd)
+            seq = f"\033[{fg}m"
+        elif cd.startswith("\033["):
+            seq = cd
+        if seq:
+            self.write(seq)
+
+    def reset_style(self):
+        """Reset ANSI colors and make sure the next prompt starts on a fresh line."""
+        if self.is_tty:
+            self.write(self.ANSI_RESET)
+        self.write("\n")
+        self.flush()
+
+    def clear_screen(self):
+        """Clear the screen and move the cursor home."""
+        if self.is_tty:
+            self.write(self.ANSI_CLEAR)
+        self.flush()
 
 
 class MyCMD:
     name = "-"  # default prompt
 
     def __init__(self):
-        self.commands = {
+        self.commands = CommandRegistry(self)
+        self.commands.update({
             "help": self.help,
             "echo": self.echo,
             "clear": self.clear,
@@ -40,21 +436,40 @@ class MyCMD:
             "run": self.run_cmd,
             "nano": self.nano,
             "version": self.version,
-            "update": self.update,
             "clipboard": self.clipboard,
             "date": lambda args: print(subprocess.getoutput("date") if os.name != 'nt' else subprocess.getoutput("echo %date% %time%")),
-            "fc": lambda args: print(subprocess.getoutput("fc " + " ".join(args)) if os.name == 'nt' else subprocess.getoutput("diff " + " ".join(args))),
+            "fc": lambda args: self._run_captured((["fc"] if os.name == 'nt' else ["diff"]) + args),
             "tree": self.tree,
             "brake" : lambda args: print("Brake command executed. (no operation)"),
             "calc": self.calc,
             "ren": self.rename_file,
             "title": self.set_name,
-            "type": lambda args: print(subprocess.getoutput("type " + " ".join(args)) if os.name == 'nt' else subprocess.getoutput("cat " + " ".join(args))),
+            "type": lambda args: self._run_captured((["cmd", "/c", "type"] if os.name == 'nt' else ["cat"]) + args),
             "verify": self.verify_command,
             "reset": self.restore_terminal,
             "specht": self.specht,
-        }
+            "plugins": self.plugins,
+            "timeout": self.timeout,
+        })
+        # per worker thread: the builtin's piped input (see the stdin property)
+        self._local = threading.local()
         self.running = True
+        # directory before the last cd (for 'cd -') and the pushd/popd stack
+        self.prev_dir = None
+        self.dir_stack = []
+        self._dir_index = None
+        # set when the running builtin should stop early (Ctrl+C or timeout)
+        self.cancel_event = threading.Event()
+        self._depth = 0
+        self.last_status = 0
+        self._command_task = None
+        self._input_future = None
+        self._history_pending = []
+        # the background flusher and the 'history' builtin run on different threads
+        self._history_lock = threading.Lock()
+        self._running_loop = False
+        # active session recorder (see 'record'), None when not recording
+        self.recorder = None
 
         # Load config from data.json (if present)
         try:
@@ -72,11 +487,24 @@ class MyCMD:
         history_file = settings.get("history_file")
         self.history_file = os.path.expanduser(history_file) if history_file else os.path.expanduser("~/.mycmd_history")
         self.max_history_size = settings.get("max_history_size", 100)
+        # memory cap (in MB) for sort before it spills sorted runs to temp files
+        self.sort_memory_mb = settings.get("sort_memory_mb", 64)
+        dir_index_file = settings.get("dir_index_file")
+        self.dir_index_file = os.path.expanduser(dir_index_file) if dir_index_file else os.path.expanduser("~/.mycmd_dirs")
+        self.dir_index_max = settings.get("dir_index_max", 1000)
         self.aliases = self.config.get("aliases", {})
         # Load usage hints from config (data.json). If not present, use empty mapping.
         self.usages = self.config.get("usages", {})
         # store version metadata in a non-conflicting attribute name
         self.version_info = self.config.get("version", {})
+
+        # Commands declared by module path are imported the first time they run
+        for cmd, spec in self.config.get("modules", {}).items():
+            self.commands.register(cmd, spec, source="data.json")
+        self.commands.completer_for.update(self.config.get("completers", {}))
+        self.commands.load_entry_points()
+        for module_name in self.config.get("plugins", []):
+            self.commands.load_plugin(module_name)
         
 
         # Try to enable prompt_toolkit-based live completion & hinting if available and enabled.
@@ -104,26 +532,16 @@ class MyCMD:
                                 for cmd in list(self.shell.commands.keys()) + list(self.shell.aliases.keys()):
                                     if cmd.startswith(word) and cmd not in seen:
                                         seen.add(cmd)
-                                        display = cmd + (' ' if cmd in self.shell.usages else '')
+                                        display = cmd + (' ' if self.shell.usage_for(cmd) else '')
                                         yield Completion(cmd, start_position=-len(word), display=display)
                             else:
                                 cmd = parts[0]
-                                filename_commands = {"mkdir", "touch", "rm", "cd", "ls", "cp", "mv", "cat"}
-                                if cmd in filename_commands:
-                                    base = word
-                                    if os.path.sep in base:
-                                        base_dir, base_name = os.path.split(base)
-                                        base_dir = base_dir or '.'
-                                    else:
-                                        base_dir, base_name = '.', base
-                                    try:
-                                        for entry in os.listdir(base_dir):
-                                            if entry.startswith(base_name):
-                                                candidate = os.path.join(base_dir, entry)
-                                                display = entry + (os.path.sep if os.path.isdir(candidate) else '')
-                                                yield Completion(entry, start_position=-len(base_name), display=display)
-                                    except Exception:
-                                        return
+                                base_name = os.path.split(word)[1]
+                                try:
+                                    for candidate in self.shell.commands.complete(cmd, word):
+                                        yield Completion(candidate.rstrip(os.path.sep), start_position=-len(base_name), display=candidate)
+                                except Exception:
+                                    return
 
                     def _pt_toolbar():
                         try:
@@ -132,7 +550,7 @@ class MyCMD:
                             parts = text.split()
                             if parts:
                                 cmd = parts[0]
-                                hint = self.usages.get(cmd)
+                                hint = self.usage_for(cmd)
                                 if hint:
                                     return HTML(f'<b>Hint:</b> {hint}')
                             return ''
@@ -150,6 +568,15 @@ class MyCMD:
         except Exception:
             self.ptk_session = None
 
+        # Route all output through the buffered terminal layer (prompt_toolkit keeps the real stdout)
+        self.out = TerminalOutput(
+            sys.stdout,
+            buffer_size=settings.get("output_buffer_kb", 64) * 1024,
+            flush_interval=settings.get("output_flush_ms", 50) / 1000,
+            max_lines=settings.get("max_output_lines", 0),
+        )
+        sys.stdout = self.out
+
         # Inform user about completion availability
         if getattr(self, "ptk_session", None):
             try:
@@ -185,6 +612,19 @@ class MyCMD:
         if self.welcome_message:
             print(self.welcome_message)
 
+        # Checked for in the background once the REPL starts; shown before a later prompt
+        self.update_notice = None
+        self.check_updates_on_start = settings.get("check_updates_on_start", False)
+
+    def _check_updates(self):
+        try:
+            from cmds.update import check_for_update
+            latest = check_for_update(self)
+        except Exception:
+            return
+        if latest:
+            self.update_notice = f"New version available: {latest}. Run 'update' to install it."
+
     def specht(self, args):
         """A simple text-to-speech command using system TTS capabilities."""
         if not args:
@@ -202,6 +642,27 @@ class MyCMD:
         except Exception as e:
             print(f"specht: error speaking text: {e}")
 
+    def usage_for(self, cmd):
+        """Usage hint for a command from data.json, falling back to one registered by a plugin."""
+        return self.usages.get(cmd) or self.commands.usages.get(cmd)
+
+    def plugins(self, args):
+        """List lazily loaded commands and plugin modules with their load times."""
+        rows = []
+        for name in sorted(self.commands):
+            cmd = self.commands[name]
+            if not isinstance(cmd, LazyCommand):
+                continue
+            status = f"loaded in {cmd.load_time * 1000:.1f} ms" if cmd.func else "not loaded"
+            rows.append(f" - {name}: {cmd.target} ({cmd.source}, {status})")
+        lines = ["Lazy commands:"] + (rows or [" (none)"])
+        lines.append("Plugin modules:")
+        if self.commands.plugins:
+            lines += [f" - {module}: loaded in {secs * 1000:.1f} ms" for module, secs in sorted(self.commands.plugins.items())]
+        else:
+            lines.append(" (none)")
+        self.out.lines(lines)
+
     def verify_command(self, args):
         """Verify if a command exists in the shell."""
         if not args:
@@ -254,22 +715,26 @@ class MyCMD:
             print(f"tree: {start_path}: No such file or directory")
             return
 
+        out = self.out
+
         def _tree(dir_path, prefix=""):
             try:
                 entries = os.listdir(dir_path)
             except Exception as e:
-                print(f"{prefix}Error accessing {dir_path}: {e}")
-                returnc
+                out.line(f"{prefix}Error accessing {dir_path}: {e}")
+                return
             entries_count = len(entries)
             for index, entry in enumerate(sorted(entries)):
+                if self.cancel_event.is_set():
+                    return
                 path = os.path.join(dir_path, entry)
                 connector = "└── " if index == entries_count - 1 else "├── "
-                print(f"{prefix}{connector}{entry}")
+                out.write(f"{prefix}{connector}{entry}\n")
                 if os.path.isdir(path):
                     extension = "    " if index == entries_count - 1 else "│   "
                     _tree(path, prefix + extension)
 
-        print(start_path)
+        out.line(start_path)
         _tree(start_path)
 
 
@@ -305,43 +770,6 @@ class MyCMD:
             print("clipboard: unknown action. Use 'copy' or 'paste'.")
 
 
-    def update(self, args):
-        """Update MyCMD shell to the latest version from GitHub."""
-        print("Checking for updates...")
-        try:
-            import requests
-            repo_api = "https://api.github.com/repos/Ovilli/own_cmd/releases/latest"
-            response = requests.get(repo_api, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                latest_version = data.get("tag_name", "").lstrip("v")
-                current_version = self.version_info.get("number", "0.0.0")
-                if latest_version and latest_version != current_version:
-                    print(f"New version available: {latest_version} (current: {current_version})")
-                    download_url = None
-                    for asset in data.get("assets", []):
-                        if asset.get("name", "").endswith(".zip"):
-                            download_url = asset.get("browser_download_url")
-                            break
-                    if download_url:
-                        print(f"Downloading update from {download_url}...")
-                        zip_response = requests.get(download_url, timeout=30)
-                        if zip_response.status_code == 200:
-                            zip_path = os.path.join(os.path.dirname(__file__), "mycmd_update.zip")
-                            with open(zip_path, 'wb') as f:
-                                f.write(zip_response.content)
-                            print(f"Update downloaded to {zip_path}. Please extract and replace existing files manually.")
-                        else:
-                            print("Failed to download the update package.")
-                    else:
-                        print("No downloadable assets found for the latest release.")
-                else:
-                    print("You are already using the latest version.")
-            else:
-                print("Failed to check for updates.")
-        except Exception as e:
-            print(f"Update failed: {e}")
-
     def version(self, args):
         """Display the version of MyCMD shell."""
         print("MyCMD Shell Version " + self.version_info.get("number", "unknown"))
@@ -393,6 +821,9 @@ class MyCMD:
         except Exception:
             pass
 
+        if self._dir_index is not None:
+            self._dir_index.save()
+
         # confirm unless user asked for immediate restart or stdin is not a tty
         if "now" not in args and sys.stdin.isatty():
             try:
@@ -437,9 +868,9 @@ class MyCMD:
             return
         search_string = args[0]
         for root, dirs, files in os.walk('.'):
-            for file in files:
-                if search_string in file:
-                    print(os.path.join(root, file))
+            if self.cancel_event.is_set():
+                return 130
+            self.out.lines(os.path.join(root, file) for file in files if search_string in file)
 
     def settings(self, args):
         """Display or modify shell settings."""
@@ -515,6 +946,7 @@ class MyCMD:
 
 
     def show_history(self, args):
+        self._flush_history()
 
         if len(args) == 1 and args[0] == "clear":
             try:
@@ -527,9 +959,7 @@ class MyCMD:
             return
         try:
             with open(self.history_file, 'r') as f:
-                history = f.readlines()
-                for line in history:
-                    print(line.strip())
+                self.out.lines(line.strip() for line in f)
         except FileNotFoundError:
             print("No history found.")
 
@@ -576,15 +1006,16 @@ class MyCMD:
                 print(f"rm: {filename}: {e}")
 
     def help(self, args):
-        print("Available commands:")
         cmd_desc = self.config.get("commands", {}) if hasattr(self, "config") else {}
+        lines = ["Available commands:"]
         for cmd in sorted(self.commands):
-            desc = cmd_desc.get(cmd)
+            desc = cmd_desc.get(cmd) or self.commands.descriptions.get(cmd)
             if desc:
-                print(f" - {cmd}: {desc}")
+                lines.append(f" - {cmd}: {desc}")
             else:
-                print(f" - {cmd}")
-        print("You can also run system commands directly.")
+                lines.append(f" - {cmd}")
+        lines.append("You can also run system commands directly.")
+        self.out.lines(lines)
 
     def echo(self, args):
         print(" ".join(args))
@@ -593,10 +1024,10 @@ class MyCMD:
         """Clear the screen robustly and reset terminal state."""
         try:
             if os.name == 'nt':
+                self.out.flush()
                 os.system('cls')
             else:
-                # ANSI clear screen and move cursor home
-                print("\033[2J\033[H", end='', flush=True)
+                self.out.clear_screen()
             try:
                 self.restore_terminal()
             except Exception:
@@ -633,42 +1064,8 @@ class MyCMD:
             pass
 
     def apply_color(self, code):
-        """Apply a color code. On Windows use 'color'; on others map hex to ANSI."""
-        if not code:
-            return
-        # Windows 'color' expects two hex digits (bgfg)
-        if os.name == 'nt':
-            try:
-                os.system(f'color {code}')
-            except Exception:
-                pass
-            return
-
-        def hex_to_fg(d):
-            v = int(d, 16)
-            if v < 8:
-                return str(30 + v)
-            return str(90 + (v - 8))
-
-        def hex_to_bg(d):
-            v = int(d, 16)
-            if v < 8:
-                return str(40 + v)
-            return str(100 + (v - 8))
-
-        seq = None
-        cd = str(code)
-        if len(cd) == 2 and all(c in "0123456789abcdefABCDEF" for c in cd):
-            bg = hex_to_bg(cd[0])
-            fg = hex_to_fg(cd[1])
-            seq = f"\033[{fg};{bg}m"
-        elif len(cd) == 1 and cd in "0123456789abcdefABCDEF":
-            fg = hex_to_fg(cd)
-            seq = f"\033[{fg}m"
-        elif cd.startswith("\033["):
-            seq = cd
-        if seq:
-            print(seq, end='')
+        """Apply a color code through the output layer."""
+        self.out.set_color(code)
 
     def save_config(self):
         """Write current config back to data.json."""
@@ -686,13 +1083,11 @@ class MyCMD:
         except Exception:
             pass
 
-    def restore_terminal(self):
+    def restore_terminal(self, args=None):
         """Reset terminal modes and ANSI state to avoid broken input after restart."""
         try:
-            # reset ANSI colors
-            print("\033[0m", end='', flush=True)
-            # newline to ensure prompt starts on fresh line
-            print("", flush=True)
+            # reset ANSI colors and start the prompt on a fresh line
+            self.out.reset_style()
             # try to make terminal sane on Unix
             if os.name != 'nt':
                 try:
@@ -716,28 +1111,6 @@ class MyCMD:
         except Exception:
             pass
 
-    def _complete_filenames(self, text):
-        """Return filename completions matching text in cwd."""
-        try:
-            base = text
-            if os.path.sep in text:
-                base_dir, base = os.path.split(text)
-                base_dir = base_dir or "."
-            else:
-                base_dir = "."
-            try:
-                for entry in os.listdir(base_dir):
-                    if entry.startswith(base):
-                        candidate = os.path.join(base_dir, entry)
-                        if os.path.isdir(candidate):
-                            yield entry + os.path.sep
-                        else:
-                            yield entry
-            except Exception:
-                return
-        except Exception:
-            return
-
     def _completer(self, text, state):
         """Readline completer: completes commands, usage hints, and filenames."""
         # get current line buffer and split
@@ -749,7 +1122,7 @@ class MyCMD:
                 candidates = []
                 for cmd in list(self.commands.keys()) + list(self.aliases.keys()):
                     if cmd.startswith(text):
-                        candidates.append(cmd + (" " if cmd in self.usages else ""))
+                        candidates.append(cmd + (" " if self.usage_for(cmd) else ""))
                 candidates = sorted(set(candidates))
                 return candidates[state] if state < len(candidates) else None
             # if completing after a command, and args empty, offer usage hint if matches command exactly
@@ -757,17 +1130,14 @@ class MyCMD:
             arg_fragment = text
             if len(parts) == 1 and not buf.endswith(" "):
                 # still typing first token
-                if cmd in self.usages:
+                hint = self.usage_for(cmd)
+                if hint:
                     # provide usage hint as a completion (non-destructive)
-                    hint = self.usages[cmd]
                     if hint.startswith(cmd):
                         return hint + (" " if not hint.endswith(" ") else "") if state == 0 else None
-            # for commands expecting filenames, offer filename completions
-            filename_commands = {"mkdir", "touch", "rm", "cd", "ls", "cp", "mv", "cat"}
-            if cmd in filename_commands:
-                candidates = list(self._complete_filenames(text) or [])
-                candidates = sorted(candidates)
-                return candidates[state] if state < len(candidates) else None
+            # offer whatever the command's registered completer suggests (files, dirs, ...)
+            candidates = sorted(self.commands.complete(cmd, text))
+            return candidates[state] if state < len(candidates) else None
         except Exception:
             pass
         return None
@@ -786,6 +1156,15 @@ class MyCMD:
             print(f"Current shell name: {self.name}")
 
     def cat(self, args):
+        if not args and self.stdin is not None:
+            # piped input: stream it through instead of reading it all at once
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            while not self.cancel_event.is_set():
+                chunk = self.stdin.read(1 << 16)
+                self.out.write(decoder.decode(chunk, final=not chunk))
+                if not chunk:
+                    break
+            return
         for filename in args:
             try:
                 with open(filename, 'r') as f:
@@ -798,8 +1177,7 @@ class MyCMD:
     def ls(self, args):
         path = args[0] if args else "."
         try:
-            for entry in os.listdir(path):
-                print(entry)
+            self.out.columns(sorted(os.listdir(path)))
         except FileNotFoundError:
             print(f"ls: cannot access '{path}': No such file or directory")
         except Exception as e:
@@ -809,73 +1187,461 @@ class MyCMD:
         if not args:
             print("cd: missing argument")
             return
+        target = args[0]
+        if target == "-":
+            if not self.prev_dir:
+                print("cd: OLDPWD not set")
+                return
+            target = self.prev_dir
+            print(target)
+        self.change_dir(target)
+
+    def change_dir(self, target, name="cd", quiet=False):
+        """chdir into target, remembering the previous directory and recording the visit. Returns success."""
+        old = os.getcwd()
         try:
-            os.chdir(args[0])
+            os.chdir(target)
         except FileNotFoundError:
-            print(f"cd: {args[0]}: No such file or directory")
+            if not quiet:
+                print(f"{name}: {target}: No such file or directory")
+            return False
         except Exception as e:
-            print(f"cd: {e}")
+            if not quiet:
+                print(f"{name}: {e}")
+            return False
+        self.prev_dir = old
+        self.dir_index.record(os.getcwd())
+        return True
+
+    @property
+    def stdin(self):
+        """Binary stream fed to the running builtin from the previous pipeline stage, or None.
+
+        Kept per thread, so a builtin left running after Ctrl+C cannot touch the next one's input.
+        """
+        return getattr(self._local, "stdin", None)
+
+    @stdin.setter
+    def stdin(self, stream):
+        self._local.stdin = stream
+
+    @property
+    def dir_index(self):
+        """Frecency index of visited directories, created on first use."""
+        if self._dir_index is None:
+            from cmds.jump import DirIndex
+            self._dir_index = DirIndex(self.dir_index_file, max_entries=self.dir_index_max)
+        return self._dir_index
+
+    def execute(self, line):
+        """Run a command line synchronously, for callers outside the event loop. Returns the exit status."""
+        return asyncio.run(self.execute_async(line))
+
+    async def execute_async(self, line, timeout=None):
+        """Run a command line, feeding each '|'-separated stage the output of the previous one.
+
+        A leading 'timeout N' cancels the whole line after N seconds.
+        """
+        # nested command lines (replay, substitutions) must not swallow a pending cancel
+        if self._depth == 0:
+            self.cancel_event.clear()
+        self._depth += 1
+        self.out.begin_command()
+        try:
+            # expansion runs command substitutions, so it is cancelled and timed like the command
+            if timeout is None:
+                status = await self._execute_line(line)
+            else:
+                status = await asyncio.wait_for(self._execute_line(line), timeout)
+        except asyncio.TimeoutError:
+            print(f"timeout: '{line}' timed out after {timeout:g}s")
+            status = 124
+        except asyncio.CancelledError:
+            print("^C")
+            status = 130
+        finally:
+            self._depth -= 1
+            self.out.end_command()
+        self.last_status = status
+        return status
+
+    async def _execute_line(self, line):
+        try:
+            words = lex(line)
+        except ValueError as e:
+            print(f"syntax error: {e}")
+            return 2
+        # 'timeout N' is recognised before expansion so it also limits command substitutions
+        if len(words) > 2 and literal(words[0]) == "timeout":
+            try:
+                timeout = float(literal(words[1]) or "")
+            except ValueError:
+                pass
+            else:
+                try:
+                    return await asyncio.wait_for(self._run_words(words[2:]), timeout)
+                except asyncio.TimeoutError:
+                    print(f"timeout: '{line}' timed out after {timeout:g}s")
+                    return 124
+        return await self._run_words(words)
 
-    def run(self):
-        while self.running:
+    async def _run_words(self, words):
+        try:
+            stages = await self._expand_words(words)
+        except ValueError as e:
+            print(f"syntax error: {e}")
+            return 2
+        if len(stages) == 1 and not stages[0]:
+            return self.last_status
+        if not all(stages):
+            print("syntax error near unexpected token '|'")
+            return 2
+        return await self._run_pipeline(stages)
+
+    async def expand(self, line):
+        """Expand a command line into pipeline stages, each a list of argument strings.
+
+        Applies tilde, variable and command substitution, splits unquoted
+        substitution results on whitespace, then expands unquoted globs.
+        Raises ValueError on unbalanced quotes.
+        """
+        return await self._expand_words(lex(line))
+
+    async def _expand_words(self, words):
+        stages = [[]]
+        for word in words:
+            if word == "|":
+                stages.append([])
+                continue
+            fields = [[]]  # each field is a list of (text, quoted) pieces
+            for kind, value, quoted in word:
+                if kind == "text":
+                    fields[-1].append((value, quoted))
+                    continue
+                if kind == "tilde":
+                    fields[-1].append((os.path.expanduser("~" + value), True))
+                    continue
+                value = self._variable(value) if kind == "var" else await self._substitute(value)
+                if quoted:
+                    fields[-1].append((value, True))
+                    continue
+                fields_text = value.split()
+                if not fields_text:
+                    continue
+                if value[0].isspace():
+                    fields.append([])
+                fields[-1].append((fields_text[0], False))
+                for extra in fields_text[1:]:
+                    fields.append([(extra, False)])
+                if value[-1].isspace():
+                    fields.append([])
+            for pieces in fields:
+                # an unquoted expansion that came out empty disappears; "" stays an argument
+                if not pieces:
+                    continue
+                text = "".join(p for p, _ in pieces)
+                if any(not quoted and any(c in p for c in "*?[") for p, quoted in pieces):
+                    pattern = "".join(p if not quoted else glob_escape(p) for p, quoted in pieces)
+                    matches = glob_cached(pattern)
+                    if matches:
+                        stages[-1].extend(matches)
+                        continue
+                stages[-1].append(text)
+        return stages
+
+    def _variable(self, name):
+        if name == "?":
+            return str(self.last_status)
+        if name == "$":
+            return str(os.getpid())
+        return os.environ.get(name, "")
+
+    async def _substitute(self, text):
+        """Run text through the builtin dispatcher and return its output without trailing newlines."""
+        stages = await self.expand(text)
+        if not all(stages):
+            return ""
+        buf = io.StringIO()
+        with self.out.redirect(buf):
+            self.last_status = await self._run_pipeline(stages, interactive=False)
+        return buf.getvalue().rstrip("\n")
+
+    async def _run_pipeline(self, stages, interactive=True):
+        pipe_in = None
+        try:
+            for index, parts in enumerate(stages):
+                if index == len(stages) - 1:
+                    return await self._run_stage(parts, pipe_in, show_hint=interactive and len(stages) == 1)
+                # spool intermediate output in memory, spilling to disk when it grows large
+                buf = tempfile.SpooledTemporaryFile(max_size=8 << 20, mode='w+b')
+                text = io.TextIOWrapper(buf, encoding='utf-8', errors='replace', write_through=True)
+                with self.out.redirect(text):
+                    await self._run_stage(parts, pipe_in, show_hint=False)
+                text.flush()
+                text.detach()
+                buf.seek(0)
+                if pipe_in is not None:
+                    pipe_in.close()
+                pipe_in = buf
+        finally:
+            if pipe_in is not None:
+                pipe_in.close()
+
+    async def _run_stage(self, parts, pipe_in=None, show_hint=True):
+        """Dispatch a single command to a builtin or a system command. Returns its exit status."""
+        cmd = parts[0]
+        args = parts[1:]
+
+        # alias translation
+        if cmd in getattr(self, "aliases", {}):
             try:
-                if getattr(self, "ptk_session", None):
-                    try:
-                        user_input = self.ptk_session.prompt(f"{self.name}> ", completer=self.ptk_completer, bottom_toolbar=self._pt_toolbar, complete_while_typing=True, complete_style=self._pt_complete_style).strip()
-                    except KeyboardInterrupt:
-                        # Exit the shell immediately on Ctrl+C
-                        print()
-                        self.exit([])
-                        break
-                    except EOFError:
-                        print()
-                        break
+                alias_parts = shlex.split(self.aliases[cmd])
+            except ValueError:
+                # aliases saved before quoting was supported may hold a stray quote
+                alias_parts = self.aliases[cmd].split()
+            cmd = alias_parts[0]
+            args = alias_parts[1:] + args
+
+        if cmd in self.commands:
+            # Show usage hint when no args provided and a usage exists
+            hint = self.usage_for(cmd)
+            if show_hint and not args and hint:
+                print(f"Hint: {hint}")
+            if cmd == "timeout":
+                return await self.timeout(args, pipe_in)
+            return await self._run_builtin(cmd, args, pipe_in)
+        return await self._run_external(cmd, args, pipe_in)
+
+    async def _run_builtin(self, cmd, args, pipe_in):
+        """Run a builtin in a worker thread so the event loop keeps serving background tasks."""
+        abandoned = threading.Event()
+        future = asyncio.get_running_loop().run_in_executor(None, self._call_builtin, cmd, args, pipe_in, abandoned)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # threads cannot be killed: ask long-running builtins (tail -f, ...) to stop
+            self.cancel_event.set()
+            try:
+                await asyncio.wait_for(asyncio.shield(future), 1)
+            except Exception:
+                # still running: whatever it prints from now on must not land on the next prompt
+                abandoned.set()
+            raise
+
+    def _call_builtin(self, cmd, args, pipe_in, abandoned=None):
+        self.stdin = pipe_in
+        self.out.mute_when(abandoned)
+        try:
+            status = self.commands[cmd](args)
+            return status if isinstance(status, int) else 0
+        except Exception as e:
+            print(f"{cmd}: {e}")
+            return 1
+        finally:
+            self.stdin = None
+            self.out.mute_when(None)
+
+    async def _run_external(self, cmd, args, pipe_in):
+        """Run a system command, streaming its output as it arrives."""
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                cmd, *args, stdin=pipe_in, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+        except FileNotFoundError:
+            print(f"Command not found: {cmd}")
+            return 127
+        except OSError as e:
+            print(f"{cmd}: {e}")
+            return 126
+        try:
+            while True:
+                chunk = await proc.stdout.read(1 << 16)
+                if not chunk:
+                    break
+                self.out.write(chunk.decode('utf-8', errors='replace'))
+            return await proc.wait()
+        except asyncio.CancelledError:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            raise
+
+    def _run_captured(self, argv):
+        """Run a system command to completion, showing its output and errors; returns its exit status."""
+        try:
+            proc = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors='replace')
+        except OSError as e:
+            print(f"{argv[0]}: {e}")
+            return 127
+        self.out.write(proc.stdout)
+        return proc.returncode
+
+    async def timeout(self, args, pipe_in=None):
+        """Run a command with a time limit. Usage: timeout [seconds] [command]
+
+        Dispatched by _run_stage rather than a worker thread, so the limited
+        command runs on the shell's event loop and keeps the stage's piped input.
+        """
+        if len(args) < 2:
+            print("Usage: timeout [seconds] [command]")
+            return 2
+        try:
+            seconds = float(args[0])
+        except ValueError:
+            print(f"timeout: invalid time interval '{args[0]}'")
+            return 2
+        try:
+            return await asyncio.wait_for(self._run_stage(args[1:], pipe_in, show_hint=False), seconds)
+        except asyncio.TimeoutError:
+            print(f"timeout: '{shlex.join(args[1:])}' timed out after {seconds:g}s")
+            return 124
+
+    def _interrupt(self):
+        """SIGINT handler: cancel the running command, or leave the shell when idle."""
+        if self._command_task is not None and not self._command_task.done():
+            self._command_task.cancel()
+        elif self._input_future is not None and not self._input_future.done():
+            self._input_future.set_exception(KeyboardInterrupt())
+
+    def _read_line(self):
+        """Read a line with input() on a daemon thread so the loop keeps running while we wait."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def settle(value, error):
+            if not future.done():
+                if error is not None:
+                    future.set_exception(error)
                 else:
-                    user_input = input(f"{self.name}> ").strip()
+                    future.set_result(value)
+
+        def reader():
+            try:
+                line = input(f"{self.name}> ")
+            except BaseException as e:
+                loop.call_soon_threadsafe(settle, None, e)
+            else:
+                loop.call_soon_threadsafe(settle, line, None)
+
+        threading.Thread(target=reader, daemon=True).start()
+        self._input_future = future
+        return future
+
+    def _flush_history(self):
+        """Append queued input lines to the history file, trimming it to max_history_size."""
+        with self._history_lock:
+            lines, self._history_pending = self._history_pending, []
+            if not lines or not getattr(self, "enable_history", False):
+                return
+            try:
+                with open(self.history_file, 'a+', encoding='utf-8') as hf:
+                    hf.writelines(line + "\n" for line in lines)
+                    hf.seek(0)
+                    kept = hf.readlines()
+                if len(kept) > self.max_history_size:
+                    with open(self.history_file, 'w', encoding='utf-8') as hf:
+                        hf.writelines(kept[-self.max_history_size:])
+            except Exception:
+                pass
+
+    async def _background(self, interval, func):
+        """Call func in a worker thread every interval seconds for as long as the loop runs."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await loop.run_in_executor(None, func)
+            except Exception:
+                pass
+
+    def _watch_interrupts(self, loop):
+        # prompt_toolkit removes loop signal handlers when a prompt ends, so this runs before every read and command
+        try:
+            loop.add_signal_handler(signal.SIGINT, self._interrupt)
+        except (NotImplementedError, RuntimeError, ValueError):
+            # Windows / non-main thread: Ctrl+C arrives as KeyboardInterrupt instead
+            pass
+
+    async def run_async(self):
+        loop = asyncio.get_running_loop()
+        tasks = [
+            loop.create_task(self._background(1.0, self._flush_history)),
+            loop.create_task(self._background(2.0, refresh_dir_cache)),
+        ]
+        if self.check_updates_on_start:
+            # a daemon thread: asyncio.run would wait for an executor stuck on a slow network
+            threading.Thread(target=self._check_updates, daemon=True).start()
+        try:
+            while self.running:
+                if self.update_notice:
+                    print(self.update_notice)
+                    self.update_notice = None
+                self.out.flush()
+                self._watch_interrupts(loop)
+                try:
+                    if getattr(self, "ptk_session", None):
+                        user_input = await self.ptk_session.prompt_async(f"{self.name}> ", completer=self.ptk_completer, bottom_toolbar=self._pt_toolbar, complete_while_typing=True, complete_style=self._pt_complete_style)
+                    else:
+                        user_input = await self._read_line()
+                except KeyboardInterrupt:
+                    # Exit the shell immediately on Ctrl+C at the prompt
+                    print()
+                    self.exit([])
+                    break
+                except EOFError:
+                    print()
+                    break
+                user_input = user_input.strip()
                 if not user_input:
                     continue
-                parts = user_input.split()
-                cmd = parts[0]
-                args = parts[1:]
-
-                # alias translation
-                if cmd in getattr(self, "aliases", {}):
-                    alias_parts = self.aliases[cmd].split()
-                    cmd = alias_parts[0]
-                    args = alias_parts[1:] + args
-
-                if cmd in self.commands:
-                    # Show usage hint when no args provided and a usage exists
-                    if not args and cmd in getattr(self, "usages", {}):
-                        print(f"Hint: {self.usages[cmd]}")
-                    self.commands[cmd](args)
-                else:
-                    # Try to run system command
-                    try:
-                        result = subprocess.run([cmd] + args, capture_output=True, text=True)
-                        print(result.stdout)
-                        if result.stderr:
-                            print(result.stderr)
-                    except FileNotFoundError:
-                        print(f"Command not found: {cmd}")
-
-                # record history
-                if getattr(self, "enable_history", False):
-                    try:
-                        with open(self.history_file, 'a+', encoding='utf-8') as hf:
-                            hf.write(user_input + "\n")
-                        with open(self.history_file, 'r', encoding='utf-8') as hf:
-                            lines = hf.readlines()
-                        if len(lines) > self.max_history_size:
-                            with open(self.history_file, 'w', encoding='utf-8') as hf:
-                                hf.writelines(lines[-self.max_history_size:])
-                    except Exception:
-                        pass
-            except KeyboardInterrupt:
-                # Exit the shell immediately on Ctrl+C
-                print()
-                self.exit([])
-                break
+                self._watch_interrupts(loop)
+                recorder = self.recorder
+                if recorder is not None:
+                    recorder.begin()
+                cwd = os.getcwd()
+                started = time.time()
+                t0 = time.perf_counter()
+                self._command_task = loop.create_task(self.execute_async(user_input))
+                try:
+                    await self._command_task
+                except Exception as e:
+                    print(f"{user_input.split()[0]}: internal error: {e}")
+                    self.last_status = 1
+                finally:
+                    self._command_task = None
+                # 'record stop' closes the recorder during the command itself
+                if recorder is not None and self.recorder is recorder:
+                    recorder.log(user_input, cwd, started, time.perf_counter() - t0, self.last_status)
+                # history is written by the background flusher
+                with self._history_lock:
+                    self._history_pending.append(user_input)
+                # warm the completion cache for wherever the command left us
+                loop.run_in_executor(None, scan_dir, ".")
+        finally:
+            for task in tasks:
+                task.cancel()
+            try:
+                loop.remove_signal_handler(signal.SIGINT)
+            except Exception:
+                pass
+
+    def run(self):
+        if self._running_loop:
+            print("run: the shell is already running")
+            return
+        self._running_loop = True
+        try:
+            asyncio.run(self.run_async())
+        except KeyboardInterrupt:
+            print()
+            self.exit([])
+        finally:
+            self._running_loop = False
+            self._flush_history()
+            if self.recorder is not None:
+                self.recorder.close()
+            if self._dir_index is not None:
+                self._dir_index.save()
+            self.out.flush()
 
 
 if __name__ == "__main__":